@@ -1,3 +1,4 @@
+import time
 import logging
 import asyncio
 
@@ -54,6 +55,13 @@ class Pool(Componet):
         self._reset()
 
         self._closed = False
+        self._acquire_metric = None
+
+    async def _setup(self, app):
+        await super()._setup(app)
+        self._acquire_metric = app.metrics.histogram(
+            'aiosvc_amqp_acquire_seconds', 'Time spent waiting for a pooled amqp publisher', ('pool', )
+        ).labels(self._name)
 
     async def _start(self):
         await self._init()
@@ -64,9 +72,16 @@ class Pool(Componet):
     async def _stop(self):
         await asyncio.gather(*[con._stop() for con in self._connections], loop=self._loop)
 
+    def _after_fork(self, loop):
+        super()._after_fork(loop)
+        self._reset()
+
     async def _new_connection(self):
         con = Publisher(self._exchange, publish_timeout=self._publish_timeout,
                         try_publish_interval=self._try_publish_interval, loop=self._loop)
+        # publishers of the pool are not attached to the application
+        if self._app is not None:
+            con._bind_metrics(self._app.metrics)
         try:
             await con._start()
         except Exception as e:
@@ -117,12 +132,18 @@ class Pool(Componet):
         return PoolAcquireContext(self, timeout)
 
     async def _acquire(self, timeout):
-        if timeout is None:
-            return await self._acquire_impl()
-        else:
-            return await asyncio.wait_for(self._acquire_impl(),
-                                          timeout=timeout,
-                                          loop=self._loop)
+        started = time.monotonic()
+        try:
+            if timeout is None:
+                return await self._acquire_impl()
+            else:
+                return await asyncio.wait_for(self._acquire_impl(),
+                                              timeout=timeout,
+                                              loop=self._loop)
+        finally:
+            # timed out acquires are observed too
+            if self._acquire_metric is not None:
+                self._acquire_metric.observe(time.monotonic() - started)
 
     async def _acquire_impl(self):
         self._check_init()
@@ -1,3 +1,4 @@
+import time
 import uuid
 import logging
 import asyncio
@@ -183,6 +184,21 @@ class Publisher(Connection):
         self._try_publish_interval = try_publish_interval
         self._consumer_tag = None
         self._publishing = 0
+        self._published_metric = None
+        self._failed_metric = None
+
+    async def _setup(self, app):
+        await super()._setup(app)
+        self._bind_metrics(app.metrics)
+
+    def _bind_metrics(self, metrics):
+        """
+        :type metrics: aiosvc.metrics.Registry
+        """
+        family = metrics.counter('aiosvc_amqp_published_total', 'Messages published to amqp server',
+                                 ('exchange', 'status'))
+        self._published_metric = family.labels(self._exchange_name, 'published')
+        self._failed_metric = family.labels(self._exchange_name, 'failed')
 
     async def _stop(self):
         self._stopping = True
@@ -201,9 +217,13 @@ class Publisher(Connection):
         try:
             await asyncio.wait_for(self._try_publish(payload, routing_key, properties, mandatory, immediate),
                            timeout=self._publish_timeout, loop=self._loop)
+            if self._published_metric is not None:
+                self._published_metric.inc()
         except Exception as e:
             logger.error("Message has not been sent to amqp server. Reason: [%s] %s. Payload: %s" % (
                 str(type(e)), str(e), payload))
+            if self._failed_metric is not None:
+                self._failed_metric.inc()
         finally:
             self._publishing -= 1
 
@@ -233,6 +253,17 @@ class Consumer(Connection):
         self._prefetch_count = prefetch_count
         self._consumer_tag = None
         self._last_delivery_tag = None
+        self._consumed_metric = None
+        self._handle_metric = None
+
+    async def _setup(self, app):
+        await super()._setup(app)
+        self._consumed_metric = app.metrics.counter(
+            'aiosvc_amqp_consumed_total', 'Messages received from amqp server', ('queue', )
+        ).labels(self._queue_name)
+        self._handle_metric = app.metrics.histogram(
+            'aiosvc_amqp_handle_seconds', 'Time spent handling a received message', ('queue', )
+        ).labels(self._queue_name)
 
     async def _start(self):
         if await super()._start():
@@ -267,7 +298,15 @@ class Consumer(Connection):
     async def _callback(self, channel, body, envelope, properties):
         logger.info("Received message: %s" % (body, ))
         self._last_delivery_tag = envelope.delivery_tag
-        await self.handle(body, envelope, properties)
+        if self._consumed_metric is None:
+            await self.handle(body, envelope, properties)
+            return
+        self._consumed_metric.inc()
+        started = time.monotonic()
+        try:
+            await self.handle(body, envelope, properties)
+        finally:
+            self._handle_metric.observe(time.monotonic() - started)
 
     async def ack_last(self):
         if self._prefetch_count != 1:
@@ -1,7 +1,12 @@
+import os
+import time
+import signal
 import logging
 import asyncio
 from collections import OrderedDict
 
+from .metrics import Registry
+
 
 logger = logging.getLogger("aiosvc")
 
@@ -15,6 +20,7 @@ class Componet(object):
     def __init__(self, *, loop=None, start_priority=1):
         self._loop = loop
         self._app = None
+        self._name = None
         self._start_priority = start_priority
 
     @property
@@ -42,19 +48,65 @@ class Componet(object):
     async def _stop(self):
         raise NotImplementedError
 
+    def _before_fork(self):
+        """
+        Called in the master process before worker processes are forked
+        """
+        pass
+
+    def _after_fork(self, loop):
+        """
+        Called in a worker process right after fork, the component must drop everything bound to the master loop
+
+        :type loop: asyncio.AbstractEventLoop
+        """
+        self._loop = loop
+
 
 class Application(object):
+    """
+    Components are started concurrently: a component waits only for the components it depends on. Dependencies are
+    given explicitly with ``attach(..., depends=[...])``, otherwise a component depends on every component with a
+    lower ``start_priority``. Components are stopped in the reverse order, also concurrently.
 
-    def __init__(self, loop: asyncio.AbstractEventLoop=None):
+    With ``run(workers=N)`` the application forks N worker processes, each of them starts its own copy of all the
+    components on its own loop. The master process restarts workers which exit unexpectedly.
+    """
+
+    # minimal lifetime of a worker in seconds, a worker which dies faster is restarted with a delay
+    worker_respawn_delay = 1.0
+
+    def __init__(self, loop: asyncio.AbstractEventLoop=None, start_timeout: float=None, stop_timeout: float=None):
         self._loop = loop or asyncio.get_event_loop()
         self._components = OrderedDict()
+        self._depends = {}
+        self._start_timeouts = {}
+        self._stop_timeouts = {}
+        self._start_timeout = start_timeout
+        self._stop_timeout = stop_timeout
+        self._start_report = OrderedDict()
+        self._stopping = False
+        self._metrics = Registry()
 
-    def attach(self, name: str, component: Componet):
+    def attach(self, name: str, component: Componet, depends=None, start_timeout: float=None,
+               stop_timeout: float=None):
+        """
+        :param depends: names of the components which must be started before this one
+        :param start_timeout: overrides application start_timeout for this component
+        :param stop_timeout: overrides application stop_timeout for this component
+        """
         if not isinstance(component, Componet):
             raise UserWarning('Component "%s" must be instance of %s.Componet' % (__package__, name))
         if name in self._components:
             raise UserWarning('Component "%s" already attached' % (name, ))
         self._components[name] = component
+        component._name = name
+        if depends is not None:
+            self._depends[name] = tuple(depends)
+        if start_timeout is not None:
+            self._start_timeouts[name] = start_timeout
+        if stop_timeout is not None:
+            self._stop_timeouts[name] = stop_timeout
         if component._loop is None:
             component._loop = self._loop
         self._loop.run_until_complete(component._setup(self))
@@ -64,21 +116,220 @@ class Application(object):
             raise AttributeError('Component "%s" doesn\'t attached' % item)
         return self._components[item]
 
-    def run(self):
-        start_order = sorted(self._components.items(), key=lambda x: x[1]._start_priority)
-        for name, component in start_order:
-            print(name)
-            self._loop.run_until_complete(component._start())
+    @property
+    def metrics(self):
+        """
+        :rtype: aiosvc.metrics.Registry
+        """
+        return self._metrics
+
+    @property
+    def start_report(self):
+        """
+        :return: start duration of each component in seconds
+        :rtype: dict
+        """
+        return OrderedDict(self._start_report)
+
+    def run(self, workers: int=None):
+        """
+        :param workers: number of worker processes to fork, the application runs in the current process if not given
+        """
+        if workers:
+            self._run_workers(workers)
+        else:
+            self._run()
+
+    def _run(self):
+        start_graph = self._start_graph()
+        stop_graph = self._stop_graph(start_graph)
+
+        started_at = self._loop.time()
+        timed_out = set()
+        results = self._loop.run_until_complete(self._run_phase('_start', start_graph, self._start_timeout,
+                                                                self._start_timeouts, self._start_report, timed_out))
+        failed = [name for name, success in results.items() if not success]
+        if failed:
+            # a start interrupted by its timeout may have acquired resources, such components are stopped too
+            started = {name for name, success in results.items() if success} | timed_out
+            logger.error('Application start failed, stopping started components')
+            self._shutdown({name: deps & started for name, deps in stop_graph.items() if name in started})
+            raise RuntimeError('Components failed to start: %s' % ', '.join(failed))
+
+        logger.info('Application started in %.3f sec (%s)' % (
+            self._loop.time() - started_at,
+            ', '.join('%s: %.3f' % (name, duration) for name, duration in self._start_report.items())))
         try:
             self._loop.run_forever()
         except KeyboardInterrupt:  # pragma: no branch
             pass
         finally:
-            logger.info("Prepare to stop application")
-            for name, component in reversed(start_order):
-                self._loop.run_until_complete(component._before_stop())
-            logger.info("Stopping application")
-            for name, component in reversed(start_order):
-                self._loop.run_until_complete(component._stop())
+            self._shutdown(stop_graph)
+
+    def _shutdown(self, stop_graph):
+        self._stopping = True
+        logger.info("Prepare to stop application")
+        self._loop.run_until_complete(self._run_phase('_before_stop', stop_graph, self._stop_timeout,
+                                                      self._stop_timeouts))
+        logger.info("Stopping application")
+        self._loop.run_until_complete(self._run_phase('_stop', stop_graph, self._stop_timeout, self._stop_timeouts))
+        logger.info('Loop close')
+        self._loop.close()
+
+    def _run_workers(self, workers):
+        for component in self._components.values():
+            component._before_fork()
+
+        pids = {}
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            if not stopping:
+                logger.info("Stopping workers")
+            stopping = True
+            for pid in pids:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+        try:
+            for num in range(workers):
+                self._spawn_worker(pids, num)
+            while pids:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+                if pid not in pids:
+                    continue
+                num, spawned_at = pids.pop(pid)
+                if stopping:
+                    logger.info("Worker %s [%s] stopped" % (num, pid))
+                    continue
+                logger.error("Worker %s [%s] exited unexpectedly with status %s, restarting" % (num, pid, status))
+                if time.monotonic() - spawned_at < self.worker_respawn_delay:
+                    time.sleep(self.worker_respawn_delay)
+                if not stopping:
+                    self._spawn_worker(pids, num)
+        finally:
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
             logger.info('Loop close')
             self._loop.close()
+
+    def _spawn_worker(self, pids, num):
+        pid = os.fork()
+        if pid:
+            logger.info("Worker %s [%s] started" % (num, pid))
+            pids[pid] = (num, time.monotonic())
+            return
+
+        status = 0
+        try:
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            # the master loop (and its selector) is shared with the other processes, never use it in a worker
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            for component in self._components.values():
+                component._after_fork(self._loop)
+            self._loop.add_signal_handler(signal.SIGTERM, self._terminate)
+            self._run()
+        except BaseException as e:
+            logger.exception("Worker %s failed: %s" % (num, e))
+            status = 1
+        finally:
+            logging.shutdown()
+            os._exit(status)
+
+    def _terminate(self):
+        if not self._stopping:
+            self._loop.stop()
+
+    def _start_graph(self):
+        """
+        :return: names of the components each component waits for before start
+        :rtype: dict
+        """
+        graph = OrderedDict()
+        for name, component in self._components.items():
+            if name in self._depends:
+                for dep in self._depends[name]:
+                    if dep not in self._components:
+                        raise UserWarning('Component "%s" depends on not attached component "%s"' % (name, dep))
+                graph[name] = set(self._depends[name])
+            else:
+                graph[name] = {dep for dep, dep_component in self._components.items()
+                               if dep_component._start_priority < component._start_priority}
+        self._sort_graph(graph)
+        return graph
+
+    @staticmethod
+    def _stop_graph(start_graph):
+        """
+        :return: names of the components each component waits for before stop
+        :rtype: dict
+        """
+        return OrderedDict((name, {dependant for dependant, deps in start_graph.items() if name in deps})
+                           for name in start_graph)
+
+    @staticmethod
+    def _sort_graph(graph):
+        order = []
+        pending = OrderedDict((name, set(deps)) for name, deps in graph.items())
+        while pending:
+            ready = [name for name, deps in pending.items() if not deps]
+            if not ready:
+                raise UserWarning('Components have circular dependencies: %s' % ', '.join(pending))
+            for name in ready:
+                del pending[name]
+                order.append(name)
+            for deps in pending.values():
+                deps.difference_update(ready)
+        return order
+
+    async def _run_phase(self, phase, graph, timeout, timeouts, report=None, timed_out=None):
+        """
+        Runs ``phase`` coroutine of every component in ``graph`` as soon as all its dependencies have completed.
+        Errors are logged, components which depend on a failed component are not started.
+
+        :param timed_out: set receiving names of the components whose phase timed out
+        :return: success of each component
+        :rtype: dict
+        """
+        tasks = OrderedDict()
+
+        async def run(name):
+            deps = [tasks[dep] for dep in graph[name]]
+            if deps:
+                await asyncio.wait(deps)
+                if phase == '_start' and not all(dep.result() for dep in deps):
+                    logger.error('Component "%s" is not started because of its dependencies' % name)
+                    return False
+            component_timeout = timeouts.get(name, timeout)
+            started_at = self._loop.time()
+            try:
+                await asyncio.wait_for(getattr(self._components[name], phase)(), component_timeout)
+            except asyncio.TimeoutError:
+                logger.error('Component "%s" %s timed out after %s sec' % (name, phase, component_timeout))
+                if timed_out is not None:
+                    timed_out.add(name)
+                return False
+            except Exception as e:
+                logger.exception('Component "%s" %s failed: %s' % (name, phase, e))
+                return False
+            duration = self._loop.time() - started_at
+            if report is not None:
+                report[name] = duration
+            logger.info('Component "%s" %s done in %.3f sec' % (name, phase, duration))
+            return True
+
+        for name in self._sort_graph(graph):
+            tasks[name] = self._loop.create_task(run(name))
+        if tasks:
+            await asyncio.wait(list(tasks.values()))
+        return OrderedDict((name, task.result()) for name, task in tasks.items())
@@ -1 +1,2 @@
-from .pg import Pool as PgPool
\ No newline at end of file
+from .pg import Pool as PgPool
+from .writer import CopyWriter
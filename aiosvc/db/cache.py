@@ -0,0 +1,220 @@
+import asyncio
+import inspect
+import logging
+
+import asyncpg
+
+from aiosvc.lru import LruCache
+
+
+logger = logging.getLogger("aiosvc")
+
+# arguments accepted by asyncpg.connect, the rest of the pool kwargs (e.g. max_inactive_connection_lifetime) are not
+_CONNECT_PARAMS = frozenset(inspect.signature(asyncpg.connect).parameters)
+
+
+class QueryCache(object):
+    """
+    Query results, LRU with TTL. Every entry is tagged with the NOTIFY channels which invalidate it, they are listened
+    on a dedicated connection. Nothing is cached while the listener is disconnected, the cache is flushed when it
+    connects again since notifications could have been missed.
+    """
+
+    def __init__(self, dsn, connect_kwargs, maxsize=1024, ttl=None, reconnect_delay=1.0, ping_interval=10.0):
+        """
+        :param connect_kwargs: kwargs of the pool, those accepted by asyncpg.connect are used for the listener
+                               connection
+        :param maxsize: max number of entries, the least recently used ones are evicted
+        :param ttl: lifetime of an entry in seconds, None - until evicted or invalidated
+        :param reconnect_delay: seconds between reconnects of the listener
+        :param ping_interval: seconds between health checks of an idle listener connection
+        """
+        self._dsn = dsn
+        self._connect_kwargs = {k: v for k, v in connect_kwargs.items() if k in _CONNECT_PARAMS}
+        self._reconnect_delay = reconnect_delay
+        self._ping_interval = ping_interval
+        # key -> (rows, tags)
+        self._entries = LruCache(maxsize, ttl, on_evict=self._untag)
+        # tag -> keys of its entries
+        self._tags = {}
+        # tag -> number of its invalidations, a result fetched before an invalidation is not stored
+        self._versions = {}
+        # number of flushes of the whole cache
+        self._generation = 0
+        # tag -> future resolved once LISTEN is done on the current connection, None while disconnected
+        self._channels = {}
+        self._conn = None
+        # asyncpg runs one operation at a time on a connection, LISTENs and pings of the listener take turns
+        self._conn_lock = None
+        self._listener = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def start(self):
+        """
+        Starts the listener, waits for the first connection attempt
+        """
+        connected = asyncio.get_event_loop().create_future()
+        self._listener = asyncio.ensure_future(self._listen(connected))
+        await connected
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        self.clear()
+
+    @property
+    def connected(self):
+        return self._conn is not None
+
+    def get(self, key):
+        """
+        :return: (found, rows)
+        :rtype: tuple
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            return True, entry[0]
+        self.misses += 1
+        return False, None
+
+    def token(self, tags):
+        """
+        :return: state of the tags taken before the query, passed to set()
+        """
+        return self._generation, tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def set(self, key, rows, tags, token, ttl=None):
+        """
+        Stores the rows unless the tags were invalidated since the token was taken
+
+        :return: whether the rows are cached
+        :rtype: bool
+        """
+        if self._conn is None or token != self.token(tags):
+            return False
+        self._remove(key)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        self._entries.set(key, (rows, tags), ttl)
+        return True
+
+    def invalidate(self, tag):
+        """
+        Removes the entries tagged with the tag
+        """
+        self._versions[tag] = self._versions.get(tag, 0) + 1
+        keys = self._tags.pop(tag, ())
+        for key in list(keys):
+            self._remove(key)
+        self.invalidations += 1
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+        self._tags.clear()
+
+    def stats(self):
+        """
+        :rtype: dict
+        """
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "connected": self.connected,
+        }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        if entry is not None:
+            self._untag(key, entry)
+
+    def _untag(self, key, entry):
+        for tag in entry[1]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    async def subscribe(self, tags):
+        """
+        Listens the tags before their results are fetched
+
+        :return: whether every tag is listened on the current connection
+        """
+        conn, lock = self._conn, self._conn_lock
+        if conn is None:
+            return False
+        # one tag after another, a LISTEN is shared by the concurrent subscribers of its tag
+        for tag in tags:
+            listening = self._channels.get(tag)
+            if listening is None:
+                listening = self._channels[tag] = asyncio.ensure_future(self._add_listener(conn, lock, tag))
+            try:
+                await asyncio.shield(listening)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error('Query cache failed to listen "%s": %s' % (tag, e))
+                if self._channels.get(tag) is listening:
+                    del self._channels[tag]
+                return False
+        # the connection may have been lost meanwhile
+        return self._conn is conn
+
+    async def _add_listener(self, conn, lock, tag):
+        async with lock:
+            await conn.add_listener(tag, self._on_notify)
+
+    def _on_notify(self, conn, pid, channel, payload):
+        self.invalidate(channel)
+
+    async def _listen(self, connected):
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn=self._dsn, **self._connect_kwargs)
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda c: lost.set())
+                for tag in list(self._channels):
+                    await conn.add_listener(tag, self._on_notify)
+                    self._channels[tag] = asyncio.get_event_loop().create_future()
+                    self._channels[tag].set_result(None)
+                # notifications sent while disconnected are lost
+                self.clear()
+                lock = asyncio.Lock()
+                self._conn, self._conn_lock = conn, lock
+                if not connected.done():
+                    connected.set_result(None)
+                logger.info('Query cache listener connected')
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), self._ping_interval)
+                    except asyncio.TimeoutError:
+                        async with lock:
+                            await conn.fetchval('SELECT 1', timeout=self._ping_interval)
+                logger.error('Query cache listener connection lost')
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error('Query cache listener failed: %s' % (e, ))
+            finally:
+                self._conn = self._conn_lock = None
+                self.clear()
+                # the channels are listened again on the next connection
+                self._channels = dict.fromkeys(self._channels)
+                if conn is not None and not conn.is_closed():
+                    conn.terminate()
+                if not connected.done():
+                    connected.set_result(None)
+            await asyncio.sleep(self._reconnect_delay)
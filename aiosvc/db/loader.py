@@ -0,0 +1,111 @@
+import asyncio
+
+
+class Loader(object):
+    """
+    Collects keys loaded in the same loop iteration and fetches them with one query, results are memoized for the
+    lifetime of the loader, so create one per request
+
+    Examples:
+        users = db.loader('SELECT * FROM users WHERE id = ANY($1)', key='id')
+
+        user, friend = await asyncio.gather(users.load(1), users.load(2))
+    """
+
+    def __init__(self, pool, query, key='id', many=False, readonly=False, max_batch_size=None):
+        """
+        :type pool: aiosvc.db.pg.Pool
+        :param query: sql or name of a declared statement, its only parameter is the array of keys
+        :param key: name of the column matched against the loaded keys
+        :param many: every key loads a list of rows instead of one row
+        :param readonly: the query may run on a replica
+        :param max_batch_size: max number of keys of one query, None - unlimited
+        """
+        self._pool = pool
+        self._query = query
+        self._key = key
+        self._many = many
+        self._readonly = readonly
+        self._max_batch_size = max_batch_size
+        # key -> future of its row(s)
+        self._memo = {}
+        # keys waiting for the next query
+        self._queue = []
+        self._scheduled = False
+        self.queries = 0
+
+    async def load(self, key):
+        """
+        :return: row of the key (list of rows with many), None (empty list) if it is not found
+        """
+        future = self._memo.get(key)
+        if future is None:
+            future = self._memo[key] = asyncio.get_event_loop().create_future()
+            self._queue.append(key)
+            if not self._scheduled:
+                self._scheduled = True
+                asyncio.get_event_loop().call_soon(self._dispatch)
+        # the future is shared by every caller of the key
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys):
+        """
+        :rtype: list
+        """
+        return await asyncio.gather(*[self.load(key) for key in keys])
+
+    def prime(self, key, value):
+        """
+        Memoizes a row loaded by other means
+        """
+        if key not in self._memo:
+            future = self._memo[key] = asyncio.get_event_loop().create_future()
+            future.set_result(value)
+
+    def clear(self, key=None):
+        """
+        Forgets the memoized row of the key, all rows by default
+        """
+        if key is None:
+            self._memo = {k: future for k, future in self._memo.items() if not future.done()}
+        else:
+            future = self._memo.get(key)
+            if future is not None and future.done():
+                del self._memo[key]
+
+    def _dispatch(self):
+        self._scheduled = False
+        keys, self._queue = self._queue, []
+        size = self._max_batch_size or len(keys)
+        for i in range(0, len(keys), size):
+            asyncio.ensure_future(self._fetch(keys[i:i + size]))
+
+    async def _fetch(self, keys):
+        self.queries += 1
+        try:
+            if self._query in self._pool._statements:
+                rows = await self._pool.fetch_named(self._query, keys, readonly=self._readonly)
+            else:
+                async with self._pool.acquire(readonly=self._readonly) as conn:
+                    rows = await conn.fetch(self._query, keys)
+        except Exception as e:
+            for key in keys:
+                future = self._memo.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+                    # callers of the key may be gone, the error must not be reported as never retrieved
+                    future.exception()
+            return
+
+        if self._many:
+            results = {key: [] for key in keys}
+            for row in rows:
+                found = results.get(row[self._key])
+                if found is not None:
+                    found.append(row)
+        else:
+            results = {row[self._key]: row for row in rows}
+        for key in keys:
+            future = self._memo[key]
+            if not future.done():
+                future.set_result(results.get(key))
@@ -1,36 +1,488 @@
+import time
 import asyncio
+import logging
 import asyncpg.pool
+from collections import OrderedDict
 from aiosvc import Componet
+from .cache import QueryCache
+from .loader import Loader
+
+
+logger = logging.getLogger("aiosvc")
+
+# seconds the replica is behind the primary, 0 if it has replayed everything it received
+_LAG_QUERY = """
+SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+"""
 
 
 class Pool(Componet):
+    """
+    Examples:
+        db = PgPool(dsn, statements={'user_by_id': 'SELECT * FROM users WHERE id = $1'})
+
+        user = await db.fetchrow_named('user_by_id', 1)
+
+    With replicas, ``acquire(readonly=True)`` returns a connection of the replica with the lowest latency weighted
+    by its outstanding connections. Replicas are checked every replica_check_interval seconds, a failing one or one
+    lagging more than max_replica_lag is out of rotation. The primary is used when no replica is available.
+    """
+
+    # seconds in which acquire_wait halves while nothing is acquired
+    acquire_wait_halflife = 1.0
 
     def __init__(self, dsn: str = None, min_size: int = 10, max_size: int = 10, max_queries: int = 50000, setup=None,
-                 start_priority=1, loop: asyncio.AbstractEventLoop = None, **connect_kwargs):
+                 statements: dict = None, replicas: list = None, max_replica_lag: float = None,
+                 replica_check_interval: float = 5.0, cache_size: int = 0, cache_ttl: float = None, start_priority=1,
+                 loop: asyncio.AbstractEventLoop = None, **connect_kwargs):
+        """
+        :param statements: name -> sql of statements prepared on every new connection
+        :param replicas: dsns of read-only replicas, pools of the same size are created for them
+        :param max_replica_lag: max replication lag in seconds of a replica in rotation, None - unlimited
+        :param replica_check_interval: seconds between replica health and lag checks
+        :param cache_size: max number of query results cached by fetch_cached, 0 - the cache is disabled
+        :param cache_ttl: lifetime of a cached result in seconds, None - until evicted or invalidated
+        """
         super().__init__(loop=loop, start_priority=start_priority)
         self._dsn = dsn
         self._min_size = min_size
         self._max_size = max_size
         self._max_queries = max_queries
         self._conn_setup = setup
+        self._conn_init = connect_kwargs.pop('init', None)
         self._connect_kwargs = connect_kwargs
         self._pool = None
+        self._statements = dict(statements or {})
+        # raw connection -> {name: asyncpg.prepared_stmt.PreparedStatement}, removed when the connection is closed
+        # (statements reference their connection, so a weak mapping would never drop them)
+        self._prepared = {}
+        self.statement_hits = 0
+        self.statement_misses = 0
+        self._replicas = [_Replica(replica_dsn) for replica_dsn in replicas or ()]
+        self._max_replica_lag = max_replica_lag
+        self._replica_check_interval = replica_check_interval
+        self._replica_checker = None
+        # connection acquired with await -> replica it belongs to
+        self._borrowed = {}
+        self._cache = QueryCache(dsn, connect_kwargs, cache_size, cache_ttl) if cache_size else None
+        # moving average of the time spent waiting for a free connection and the time it was updated
+        self._acquire_wait = 0.0
+        self._acquire_observed_at = 0.0
+        # running acquires -> their start time, in the order they started
+        self._pending_acquires = OrderedDict()
+        self._acquire_metric = None
+
+    async def _setup(self, app):
+        await super()._setup(app)
+        self._acquire_metric = app.metrics.histogram(
+            'aiosvc_db_acquire_seconds', 'Time spent waiting for a pooled database connection', ('pool', )
+        ).labels(self._name)
+        if self._replicas:
+            lag_metric = app.metrics.gauge('aiosvc_db_replica_lag_seconds', 'Replication lag of a replica',
+                                           ('pool', 'replica'))
+            for i, replica in enumerate(self._replicas):
+                replica.lag_metric = lag_metric.labels(self._name, str(i))
 
     async def _start(self):
-        self._pool = await asyncpg.create_pool(loop=self._loop, dsn=self._dsn, min_size=self._min_size,
-                                               max_size=self._max_size, max_queries=self._max_queries,
-                                               setup=self._conn_setup, **self._connect_kwargs)
+        self._pool = await self._create_pool(self._dsn)
+        if self._replicas:
+            await asyncio.gather(*[self._check_replica(replica) for replica in self._replicas])
+            self._replica_checker = asyncio.ensure_future(self._check_replicas())
+        if self._cache is not None:
+            await self._cache.start()
+
+    async def _create_pool(self, dsn):
+        return await asyncpg.create_pool(loop=self._loop, dsn=dsn, min_size=self._min_size,
+                                         max_size=self._max_size, max_queries=self._max_queries,
+                                         setup=self._conn_setup, init=self._init_connection,
+                                         **self._connect_kwargs)
+
+    async def _check_replicas(self):
+        while True:
+            await asyncio.sleep(self._replica_check_interval)
+            await asyncio.gather(*[self._check_replica(replica) for replica in self._replicas])
+
+    async def _check_replica(self, replica):
+        """
+        Measures latency and lag of the replica, a replica whose pool failed to start is started again
+        """
+        try:
+            if replica.pool is None:
+                replica.pool = await self._create_pool(replica.dsn)
+            started = time.monotonic()
+            lag = await replica.pool.fetchval(_LAG_QUERY, timeout=self._replica_check_interval)
+            latency = time.monotonic() - started
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if replica.healthy:
+                logger.error('Replica %s of pool "%s" is out of rotation: %s' % (replica.dsn, self._name, e))
+            replica.healthy = False
+            return
+        replica.lag = float(lag or 0)
+        replica.latency = latency if replica.latency is None else replica.latency + (latency - replica.latency) * .3
+        if not replica.healthy:
+            logger.info('Replica %s of pool "%s" is back in rotation' % (replica.dsn, self._name))
+        replica.healthy = True
+        if replica.lag_metric is not None:
+            replica.lag_metric.set(replica.lag)
+
+    def _choose_replica(self):
+        """
+        :rtype: _Replica | None
+        """
+        best = None
+        best_score = None
+        for replica in self._replicas:
+            if not replica.healthy or replica.pool is None:
+                continue
+            if self._max_replica_lag is not None and replica.lag > self._max_replica_lag:
+                continue
+            score = (replica.outstanding + 1) * max(replica.latency, 0.0001)
+            if best is None or score < best_score:
+                best = replica
+                best_score = score
+        return best
+
+    async def _init_connection(self, conn):
+        if self._conn_init is not None:
+            await self._conn_init(conn)
+        prepared = {}
+        for name, sql in self._statements.items():
+            prepared[name] = await conn.prepare(sql)
+        self._prepared[conn] = prepared
+        conn.add_termination_listener(lambda _: self._prepared.pop(conn, None))
 
     async def _before_stop(self):
-        pass
+        if self._replica_checker is not None:
+            self._replica_checker.cancel()
+            self._replica_checker = None
+        if self._cache is not None:
+            await self._cache.stop()
 
     async def _stop(self):
-        await self._pool.close()
+        await asyncio.gather(self._pool.close(),
+                             *[replica.pool.close() for replica in self._replicas if replica.pool is not None])
 
-    def acquire(self, timeout: float = None) -> asyncpg.pool.Pool:
+    def acquire(self, timeout: float = None, readonly: bool = False):
         """
+        Can be used in an ``await`` expression (the connection must be released) or with an ``async with`` block.
+
         :param timeout: A timeout for acquiring a Connection.
         :type timeout: float | None
-        :rtype: asyncpg.pool.Pool
+        :param readonly: the connection is used only for reads and may belong to a replica
+        :rtype: PoolAcquireContext
+        """
+        return PoolAcquireContext(self, timeout, readonly)
+
+    def transaction(self, readonly: bool = False, timeout: float = None, **kwargs):
+        """
+        Acquires a connection and starts a transaction on it, read-only transactions run on replicas
+
+        Usage:
+            async with db.transaction(readonly=True) as conn:
+                ...
+
+        :param kwargs: passed to asyncpg.Connection.transaction, e.g. isolation
+        :rtype: PoolTransactionContext
+        """
+        return PoolTransactionContext(self, timeout, readonly, kwargs)
+
+    async def release(self, connection):
+        replica = self._borrowed.pop(connection, None)
+        await self._release(connection, replica)
+
+    async def _release(self, connection, replica):
+        if replica is None:
+            await self._pool.release(connection)
+        else:
+            replica.outstanding -= 1
+            await replica.pool.release(connection)
+
+    @property
+    def acquire_wait(self):
+        """
+        Moving average of the time spent waiting for a free connection, seconds. It decays while nothing is acquired
+        and is at least the wait of the oldest running acquire, so it follows the pool both ways while requests are
+        shed by it.
+        """
+        now = time.monotonic()
+        wait = self._decayed_wait(now)
+        if self._pending_acquires:
+            wait = max(wait, now - next(iter(self._pending_acquires.values())))
+        return wait
+
+    async def _acquire(self, timeout, readonly=False):
+        """
+        :return: connection and the replica it belongs to
+        :rtype: tuple
+        """
+        started = time.monotonic()
+        token = object()
+        self._pending_acquires[token] = started
+        try:
+            return await self._acquire_connection(timeout, readonly)
+        finally:
+            del self._pending_acquires[token]
+            # failed and timed out acquires are the longest waits, they count too
+            self._observe_acquire(time.monotonic() - started)
+
+    async def _acquire_connection(self, timeout, readonly):
+        replica = self._choose_replica() if readonly else None
+        connection = None
+        if replica is not None:
+            replica.outstanding += 1
+            try:
+                connection = await replica.pool.acquire(timeout=timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                replica.outstanding -= 1
+                raise
+            except Exception as e:
+                replica.outstanding -= 1
+                replica.healthy = False
+                logger.error('Replica %s of pool "%s" is out of rotation: %s' % (replica.dsn, self._name, e))
+                replica = None
+        if connection is None:
+            connection = await self._pool.acquire(timeout=timeout)
+        return connection, replica
+
+    def add_statement(self, name, sql):
+        """
+        Declares a named statement, connections opened earlier prepare it on first use
+        """
+        if name in self._statements and self._statements[name] != sql:
+            raise UserWarning('Statement "%s" is already declared' % name)
+        self._statements[name] = sql
+
+    async def statement(self, conn, name):
+        """
+        :param conn: acquired connection
+        :rtype: asyncpg.prepared_stmt.PreparedStatement
+        """
+        raw = getattr(conn, '_con', conn)
+        prepared = self._prepared.get(raw)
+        if prepared is not None and name in prepared:
+            self.statement_hits += 1
+            return prepared[name]
+        if name not in self._statements:
+            raise UserWarning('Unknown statement "%s"' % name)
+        self.statement_misses += 1
+        stmt = await conn.prepare(self._statements[name])
+        if raw in self._prepared:
+            self._prepared[raw][name] = stmt
+        return stmt
+
+    def statement_stats(self):
+        """
+        :rtype: dict
+        """
+        return {
+            "statements": len(self._statements),
+            "connections": len(self._prepared),
+            "hits": self.statement_hits,
+            "misses": self.statement_misses,
+        }
+
+    async def fetch_named(self, name, *args, conn=None, readonly: bool = False, timeout: float = None):
         """
-        return self._pool.acquire(timeout=timeout)
+        :param conn: connection to run on, e.g. in a transaction, a pooled one by default
+        :param readonly: a pooled connection may belong to a replica
+        :param timeout: statement timeout
+        """
+        if conn is not None:
+            return await (await self.statement(conn, name)).fetch(*args, timeout=timeout)
+        async with self.acquire(readonly=readonly) as conn:
+            return await (await self.statement(conn, name)).fetch(*args, timeout=timeout)
+
+    async def fetchrow_named(self, name, *args, conn=None, readonly: bool = False, timeout: float = None):
+        if conn is not None:
+            return await (await self.statement(conn, name)).fetchrow(*args, timeout=timeout)
+        async with self.acquire(readonly=readonly) as conn:
+            return await (await self.statement(conn, name)).fetchrow(*args, timeout=timeout)
+
+    async def fetchval_named(self, name, *args, column=0, conn=None, readonly: bool = False,
+                             timeout: float = None):
+        if conn is not None:
+            return await (await self.statement(conn, name)).fetchval(*args, column=column, timeout=timeout)
+        async with self.acquire(readonly=readonly) as conn:
+            return await (await self.statement(conn, name)).fetchval(*args, column=column, timeout=timeout)
+
+    async def execute_named(self, name, *args, conn=None, timeout: float = None):
+        """
+        :return: status of the last command, e.g. 'UPDATE 1'
+        """
+        if conn is not None:
+            stmt = await self.statement(conn, name)
+            await stmt.fetch(*args, timeout=timeout)
+            return stmt.get_statusmsg()
+        async with self.acquire() as conn:
+            stmt = await self.statement(conn, name)
+            await stmt.fetch(*args, timeout=timeout)
+            return stmt.get_statusmsg()
+
+    async def fetch_cached(self, query, *args, tags=(), ttl: float = None, readonly: bool = False,
+                           timeout: float = None):
+        """
+        Fetches rows through the query cache, the result is cached until a NOTIFY on any of the tags, e.g.
+        ``await db.fetch_cached('SELECT * FROM countries', tags=('countries', ))`` is invalidated by
+        ``NOTIFY countries`` or ``await db.notify('countries')`` in any process. Cached rows must not be mutated.
+
+        :param tags: NOTIFY channels invalidating the result
+        :param ttl: lifetime of the result in seconds, cache_ttl by default
+        :param readonly: the query may run on a replica, a lagging one may get a stale result cached
+        """
+        if self._cache is None:
+            raise UserWarning('Query cache of pool "%s" is disabled, set cache_size' % (self._name, ))
+        key = (query, args)
+        try:
+            found, rows = self._cache.get(key)
+        except TypeError:
+            # unhashable args
+            key = None
+            found = False
+        if found:
+            return rows
+        tags = tuple(tags)
+        if key is not None and not await self._cache.subscribe(tags):
+            key = None
+        token = self._cache.token(tags)
+        async with self.acquire(readonly=readonly) as conn:
+            rows = await conn.fetch(query, *args, timeout=timeout)
+        if key is not None:
+            self._cache.set(key, rows, tags, token, ttl)
+        return rows
+
+    def invalidate(self, tag=None):
+        """
+        Invalidates cached results of this process tagged with the tag, all by default
+        """
+        if self._cache is None:
+            return
+        if tag is None:
+            self._cache.clear()
+        else:
+            self._cache.invalidate(tag)
+
+    async def notify(self, tag, conn=None):
+        """
+        Invalidates cached results tagged with the tag in every process, sent on commit if conn is in a transaction
+        """
+        if conn is not None:
+            await conn.execute("SELECT pg_notify($1, '')", tag)
+            return
+        async with self.acquire() as conn:
+            await conn.execute("SELECT pg_notify($1, '')", tag)
+
+    def cache_stats(self):
+        """
+        :rtype: dict | None
+        """
+        return self._cache.stats() if self._cache is not None else None
+
+    def loader(self, query, key='id', many=False, readonly=False, max_batch_size=None):
+        """
+        Creates a loader batching single key lookups of one loop iteration into one query, e.g.
+        ``db.loader('SELECT * FROM users WHERE id = ANY($1)')``. Rows are memoized by the loader, create one per request.
+
+        :param query: sql or name of a declared statement, its only parameter is the array of keys
+        :param key: name of the column matched against the loaded keys
+        :param many: every key loads a list of rows instead of one row
+        :param readonly: the query may run on a replica
+        :param max_batch_size: max number of keys of one query, None - unlimited
+        :rtype: aiosvc.db.loader.Loader
+        """
+        return Loader(self, query, key, many, readonly, max_batch_size)
+
+    def _decayed_wait(self, now):
+        if not self._acquire_wait:
+            return 0.0
+        return self._acquire_wait * 0.5 ** ((now - self._acquire_observed_at) / self.acquire_wait_halflife)
+
+    def _observe_acquire(self, wait):
+        now = time.monotonic()
+        current = self._decayed_wait(now)
+        self._acquire_wait = current + (wait - current) * .1
+        self._acquire_observed_at = now
+        if self._acquire_metric is not None:
+            self._acquire_metric.observe(wait)
+
+
+class _Replica(object):
+
+    __slots__ = ('dsn', 'pool', 'outstanding', 'latency', 'lag', 'healthy', 'lag_metric')
+
+    def __init__(self, dsn):
+        self.dsn = dsn
+        self.pool = None
+        # connections acquired and not released yet
+        self.outstanding = 0
+        # moving average of the health check round trip, seconds
+        self.latency = None
+        self.lag = 0.0
+        self.healthy = False
+        self.lag_metric = None
+
+
+class PoolAcquireContext:
+
+    __slots__ = ('timeout', 'readonly', 'connection', 'replica', 'done', 'component')
+
+    def __init__(self, component, timeout, readonly=False):
+        self.component = component
+        self.timeout = timeout
+        self.readonly = readonly
+        self.connection = None
+        self.replica = None
+        self.done = False
+
+    async def __aenter__(self):
+        if self.connection is not None or self.done:
+            raise UserWarning('a connection is already acquired')
+        self.connection, self.replica = await self.component._acquire(self.timeout, self.readonly)
+        return self.connection
+
+    async def __aexit__(self, *exc):
+        self.done = True
+        con = self.connection
+        self.connection = None
+        await self.component._release(con, self.replica)
+
+    def __await__(self):
+        self.done = True
+        return self._acquire_borrowed().__await__()
+
+    async def _acquire_borrowed(self):
+        connection, replica = await self.component._acquire(self.timeout, self.readonly)
+        if replica is not None:
+            self.component._borrowed[connection] = replica
+        return connection
+
+
+class PoolTransactionContext:
+
+    __slots__ = ('acquire_context', 'transaction', 'kwargs')
+
+    def __init__(self, component, timeout, readonly, kwargs):
+        self.acquire_context = PoolAcquireContext(component, timeout, readonly)
+        self.transaction = None
+        self.kwargs = kwargs
+
+    async def __aenter__(self):
+        connection = await self.acquire_context.__aenter__()
+        try:
+            self.transaction = connection.transaction(readonly=self.acquire_context.readonly, **self.kwargs)
+            await self.transaction.start()
+        except BaseException:
+            await self.acquire_context.__aexit__()
+            raise
+        return connection
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                await self.transaction.commit()
+            else:
+                await self.transaction.rollback()
+        finally:
+            await self.acquire_context.__aexit__()
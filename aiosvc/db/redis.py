@@ -1,3 +1,4 @@
+import time
 import asyncio
 import aioredis
 from aiosvc import Componet
@@ -16,6 +17,13 @@ class Pool(Componet):
         self._max_size = max_size
         self._connect_kwargs = connect_kwargs
         self._pool = None
+        self._acquire_metric = None
+
+    async def _setup(self, app):
+        await super()._setup(app)
+        self._acquire_metric = app.metrics.histogram(
+            'aiosvc_redis_acquire_seconds', 'Time spent waiting for a pooled redis connection', ('pool', )
+        ).labels(self._name)
 
     async def _start(self):
         self._pool = await aioredis.create_pool(loop=self._loop, address=self._address, db=self._db,
@@ -37,6 +45,16 @@ class Pool(Componet):
         """
         return PoolAcquireContext(self, timeout)
 
+    async def execute(self, command, *args, timeout: float = None):
+        """
+        Executes a single command on a pooled connection
+
+        :param timeout: A timeout for acquiring a Connection.
+        :type timeout: float | None
+        """
+        async with self.acquire(timeout) as conn:
+            return await conn.connection.execute(command, *args)
+
 
 class PoolAcquireContext:
 
@@ -51,12 +69,15 @@ class PoolAcquireContext:
     async def __aenter__(self):
         if self.connection is not None or self.done:
             raise UserWarning('a connection is already acquired')
+        started = time.monotonic()
         if self.timeout is None:
             self.connection = await self.component._pool.acquire()
         else:
             self.connection = await asyncio.wait_for(self.component._pool.acquire(),
                              timeout=self.timeout,
                              loop=self.component._loop)
+        if self.component._acquire_metric is not None:
+            self.component._acquire_metric.observe(time.monotonic() - started)
         return self.connection
 
     async def __aexit__(self, *exc):
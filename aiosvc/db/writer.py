@@ -0,0 +1,173 @@
+import asyncio
+import logging
+
+from aiosvc import Componet
+
+
+logger = logging.getLogger("aiosvc")
+
+
+class _Batch(object):
+
+    __slots__ = ('records', 'future', 'handle')
+
+    def __init__(self, future):
+        self.records = []
+        self.future = future
+        self.handle = None
+
+
+class CopyWriter(Componet):
+    """
+    Buffers rows from any number of coroutines and writes them with COPY, one round trip per batch
+
+    Examples:
+        app.attach('db', PgPool(dsn))
+        app.attach('events', CopyWriter(tables={'events': ('ts', 'user_id', 'kind')}), depends=['db'])
+
+        await app.events.write('events', (ts, user_id, 'login'))  # returns when the row is committed
+        await app.events.put('events', (ts, user_id, 'view'))     # returns when the row is buffered
+    """
+
+    def __init__(self, tables: dict, pool='db', max_rows=1000, flush_interval=0.1, max_buffer=10000,
+                 flush_concurrency=2, timeout: float = None, start_priority=2, loop: asyncio.AbstractEventLoop = None):
+        """
+        :param tables: table name (optionally schema qualified) -> names of the columns of written records
+        :param pool: aiosvc.db.PgPool component or its name
+        :param max_rows: a table batch is flushed when it has this number of rows
+        :param flush_interval: max seconds a row waits in the buffer
+        :param max_buffer: max number of buffered and flushing rows, writers wait for space beyond it
+        :param flush_concurrency: max number of batches copied concurrently
+        :param timeout: timeout of one COPY
+        """
+        super().__init__(loop=loop, start_priority=start_priority)
+        self._tables = {}
+        for table, columns in tables.items():
+            schema, _, name = table.rpartition('.')
+            self._tables[table] = (schema or None, name, tuple(columns))
+        self._pool_name = pool if isinstance(pool, str) else None
+        self._pool = None if isinstance(pool, str) else pool
+        self._max_rows = max_rows
+        self._flush_interval = flush_interval
+        self._max_buffer = max_buffer
+        self._flush_concurrency = flush_concurrency
+        self._timeout = timeout
+        # table -> _Batch being filled
+        self._batches = {}
+        self._flushes = set()
+        self._buffered = 0
+        self._space = None
+        self._semaphore = None
+        self._closing = False
+        self._rows_metric = None
+
+    async def _setup(self, app):
+        await super()._setup(app)
+        self._rows_metric = app.metrics.counter(
+            'aiosvc_db_copy_rows_total', 'Rows written with COPY', ('writer', 'table', 'status')
+        )
+
+    async def _start(self):
+        if self._pool_name is not None:
+            self._pool = getattr(self._app, self._pool_name)
+        self._space = asyncio.Event()
+        self._space.set()
+        self._semaphore = asyncio.Semaphore(self._flush_concurrency)
+        self._closing = False
+
+    async def _before_stop(self):
+        # new rows are refused, buffered ones are written
+        self._closing = True
+        if self._space is not None:
+            self._space.set()
+        for table in list(self._batches):
+            self._flush(table)
+        if self._flushes:
+            await asyncio.wait(list(self._flushes))
+
+    async def _stop(self):
+        pass
+
+    def _after_fork(self, loop):
+        super()._after_fork(loop)
+        self._batches = {}
+        self._flushes = set()
+        self._buffered = 0
+
+    @property
+    def buffered(self):
+        """
+        :return: number of buffered and flushing rows
+        """
+        return self._buffered
+
+    async def put(self, table, record):
+        """
+        Buffers the record, waits while the buffer is full
+
+        :param record: tuple of values in the order of the table columns
+        :return: future resolved with the number of rows of the batch once it is committed, it is shared by the
+                 rows of the batch and must not be cancelled
+        :rtype: asyncio.Future
+        """
+        if table not in self._tables:
+            raise UserWarning('Unknown table "%s"' % table)
+        while self._buffered >= self._max_buffer and not self._closing:
+            self._space.clear()
+            await self._space.wait()
+        if self._closing or self._space is None:
+            raise UserWarning('Writer "%s" is not running' % (self._name, ))
+
+        batch = self._batches.get(table)
+        if batch is None:
+            batch = self._batches[table] = _Batch(self._loop.create_future())
+            batch.handle = self._loop.call_later(self._flush_interval, self._flush, table)
+        batch.records.append(record)
+        self._buffered += 1
+        if len(batch.records) >= self._max_rows:
+            self._flush(table)
+        return batch.future
+
+    async def write(self, table, record):
+        """
+        Buffers the record and waits until it is committed
+
+        :raise Exception: error of the COPY
+        """
+        return await asyncio.shield(await self.put(table, record))
+
+    def _flush(self, table):
+        batch = self._batches.pop(table, None)
+        if batch is None:
+            return
+        batch.handle.cancel()
+        task = asyncio.ensure_future(self._copy(table, batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _copy(self, table, batch):
+        schema, name, columns = self._tables[table]
+        try:
+            async with self._semaphore:
+                async with self._pool.acquire() as conn:
+                    await conn.copy_records_to_table(name, records=batch.records, columns=columns,
+                                                     schema_name=schema, timeout=self._timeout)
+        except Exception as e:
+            logger.error('Writer "%s" failed to copy %s rows to "%s": %s' % (self._name, len(batch.records), table, e))
+            self._count(table, 'error', len(batch.records))
+            if not batch.future.done():
+                batch.future.set_exception(e)
+                # the error is logged, callers of put() are not obliged to await the future
+                batch.future.exception()
+        else:
+            self._count(table, 'ok', len(batch.records))
+            if not batch.future.done():
+                batch.future.set_result(len(batch.records))
+        finally:
+            self._buffered -= len(batch.records)
+            if self._buffered < self._max_buffer:
+                self._space.set()
+
+    def _count(self, table, status, rows):
+        if self._rows_metric is not None:
+            self._rows_metric.labels(self._name, table, status).inc(rows)
@@ -0,0 +1,66 @@
+import time
+from collections import OrderedDict
+
+
+class LruCache(object):
+    """
+    Mapping of at most maxsize entries, the least recently used ones are evicted. An entry expires ttl seconds after
+    it is set. Values are returned as stored, not copied, so they are shared by every reader and must not be mutated.
+    """
+
+    def __init__(self, maxsize, ttl=None, on_evict=None):
+        """
+        :param maxsize: max number of entries
+        :param ttl: default lifetime of an entry in seconds, None - until evicted
+        :param on_evict: function(key, value) called for entries dropped because of maxsize or ttl
+        """
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._on_evict = on_evict
+        # key -> (expires_at, value)
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def get(self, key, default=None):
+        """
+        :return: value of a live entry, default if there is none
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        if entry[0] is not None and entry[0] <= time.monotonic():
+            del self._entries[key]
+            if self._on_evict is not None:
+                self._on_evict(key, entry[1])
+            return default
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """
+        :param ttl: lifetime of the entry in seconds, the default ttl if None
+        """
+        ttl = ttl if ttl is not None else self._ttl
+        self._entries[key] = (time.monotonic() + ttl if ttl is not None else None, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._maxsize:
+            evicted, (_, evicted_value) = self._entries.popitem(last=False)
+            if self._on_evict is not None:
+                self._on_evict(evicted, evicted_value)
+
+    def pop(self, key, default=None):
+        """
+        Removes the entry, on_evict is not called
+
+        :return: its value, even if it has expired
+        """
+        entry = self._entries.pop(key, None)
+        return entry[1] if entry is not None else default
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,159 @@
+import bisect
+from collections import OrderedDict
+
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter(object):
+
+    __slots__ = ('value', )
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def _samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Gauge(object):
+
+    __slots__ = ('value', '_function')
+
+    def __init__(self):
+        self.value = 0
+        self._function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """
+        :param function: called on every export to get the current value
+        """
+        self._function = function
+
+    def _samples(self, name, labels):
+        yield name, labels, self._function() if self._function is not None else self.value
+
+
+class Histogram(object):
+    """
+    Fixed buckets histogram, an observation is one bisect and two additions
+    """
+
+    __slots__ = ('_buckets', '_counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        # the last one counts observations above the highest bucket
+        self._counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self._counts[bisect.bisect_left(self._buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def _samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self._buckets, self._counts):
+            cumulative += count
+            yield name + '_bucket', labels + (('le', _format_value(bound)), ), cumulative
+        yield name + '_bucket', labels + (('le', '+Inf'), ), self.count
+        yield name + '_sum', labels, self.sum
+        yield name + '_count', labels, self.count
+
+
+class MetricFamily(object):
+    """
+    A named metric with a child per set of label values.
+    Children should be taken once with labels() and kept, so observations do not look them up.
+    """
+
+    def __init__(self, name, help, type, labels=(), buckets=None):
+        self.name = name
+        self.help = help
+        self.type = type
+        self._label_names = tuple(labels)
+        self._buckets = tuple(sorted(buckets or DEFAULT_BUCKETS))
+        self._children = OrderedDict()
+
+    def labels(self, *values):
+        """
+        :rtype: Counter | Gauge | Histogram
+        """
+        if len(values) != len(self._label_names):
+            raise UserWarning('Metric "%s" expects labels: %s' % (self.name, ", ".join(self._label_names)))
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if self.type == 'histogram':
+                child = Histogram(self._buckets)
+            elif self.type == 'gauge':
+                child = Gauge()
+            else:
+                child = Counter()
+            self._children[values] = child
+        return child
+
+    def expose(self):
+        lines = ['# HELP %s %s' % (self.name, self.help.replace('\\', '\\\\').replace('\n', '\\n')),
+                 '# TYPE %s %s' % (self.name, self.type)]
+        for values, child in list(self._children.items()):
+            for name, labels, value in child._samples(self.name, tuple(zip(self._label_names, values))):
+                if labels:
+                    lines.append('%s{%s} %s' % (name, ",".join('%s="%s"' % (label, _escape(label_value))
+                                                                for label, label_value in labels),
+                                                _format_value(value)))
+                else:
+                    lines.append('%s %s' % (name, _format_value(value)))
+        return "\n".join(lines)
+
+
+class Registry(object):
+    """
+    Metrics of an application, exposed in Prometheus text format
+    """
+
+    def __init__(self):
+        self._families = OrderedDict()
+
+    def counter(self, name, help, labels=()):
+        return self._family(name, help, 'counter', labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._family(name, help, 'gauge', labels)
+
+    def histogram(self, name, help, labels=(), buckets=None):
+        return self._family(name, help, 'histogram', labels, buckets)
+
+    def expose(self):
+        """
+        :rtype: str
+        """
+        return "\n".join(family.expose() for family in self._families.values()) + "\n"
+
+    def _family(self, name, help, type, labels, buckets=None):
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = MetricFamily(name, help, type, labels, buckets)
+        elif family.type != type:
+            raise UserWarning('Metric "%s" is already registered as %s' % (name, family.type))
+        return family
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(value)
+    return str(value)
@@ -0,0 +1,3 @@
+from .client import Client
+from .rpc import JsonRpcClient, RpcClientError, CircuitOpenError
+from .breaker import CircuitBreaker
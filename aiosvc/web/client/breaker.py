@@ -0,0 +1,87 @@
+import time
+
+
+class CircuitBreaker(object):
+    """
+    Stops requests to an endpoint after consecutive failures. After reset_timeout one probe request is let through
+    (half-open), its success closes the circuit, its failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0):
+        """
+        :param failure_threshold: number of consecutive failures which opens the circuit
+        :param reset_timeout: seconds the circuit stays open before a probe
+        """
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self.state = self.CLOSED
+
+    def allow(self):
+        """
+        :return: whether a request may be sent now, a True in the open state starts the probe
+        :rtype: bool
+        """
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self._reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def success(self):
+        self._failures = 0
+        self._probing = False
+        self.state = self.CLOSED
+
+    def failure(self):
+        self._failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self._failures >= self._failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def cancel(self):
+        """
+        A request was abandoned without an outcome, e.g. it lost a hedge race
+        """
+        self._probing = False
+
+
+class LatencyWindow(object):
+    """
+    Latencies of the last size requests, the percentile is recomputed every refresh observations
+    """
+
+    def __init__(self, percentile, size=1000, min_samples=100, refresh=100):
+        """
+        :param percentile: e.g. 0.95
+        """
+        self._percentile = percentile
+        self._size = size
+        self._min_samples = min_samples
+        self._refresh = refresh
+        self._samples = []
+        self._pos = 0
+        self._observed = 0
+        self.value = None
+
+    def observe(self, latency):
+        if len(self._samples) < self._size:
+            self._samples.append(latency)
+        else:
+            self._samples[self._pos] = latency
+            self._pos = (self._pos + 1) % self._size
+        self._observed += 1
+        if len(self._samples) >= self._min_samples and (self.value is None or self._observed % self._refresh == 0):
+            samples = sorted(self._samples)
+            self.value = samples[min(int(len(samples) * self._percentile), len(samples) - 1)]
@@ -0,0 +1,184 @@
+import time
+import asyncio
+import logging
+
+import aiohttp
+
+from aiosvc import Componet
+
+
+logger = logging.getLogger("aiosvc")
+
+
+class Client(Componet):
+    """
+    Http client with a shared keep-alive connection pool
+
+    Examples:
+        app.attach('billing', Client('http://billing:8080', limit_per_host=20, warm_connections=4))
+
+        async with app.billing.get('/status') as resp:
+            data = await resp.json()
+    """
+
+    def __init__(self, base_url=None, limit=100, limit_per_host=0, ttl_dns_cache=10, keepalive_timeout=15,
+                 timeout=None, connect_timeout=None, read_timeout=None, headers=None, warm_connections=0,
+                 warm_path='/', start_priority=1, loop=None, **session_kwargs):
+        """
+        :param base_url: prefix of relative urls, e.g. 'http://billing:8080'
+        :param limit: max number of open connections, 0 - unlimited
+        :param limit_per_host: max number of open connections to one host, 0 - unlimited
+        :param ttl_dns_cache: seconds resolved addresses are cached, None - forever
+        :param keepalive_timeout: seconds an idle connection is kept open
+        :param timeout: max time of a whole request in seconds, None - unlimited
+        :param connect_timeout: max time to acquire and establish a connection
+        :param read_timeout: max time between two reads from the socket
+        :param warm_connections: number of connections to base_url opened at start
+        :param warm_path: path requested with HEAD to open the warm connections
+        :param session_kwargs: passed to aiohttp.ClientSession
+        """
+        super().__init__(loop=loop, start_priority=start_priority)
+        self._base_url = base_url.rstrip('/') if base_url else None
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._ttl_dns_cache = ttl_dns_cache
+        self._keepalive_timeout = keepalive_timeout
+        self._timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout, sock_read=read_timeout)
+        self._headers = headers
+        self._warm_connections = warm_connections
+        self._warm_path = warm_path
+        self._session_kwargs = session_kwargs
+        self._session = None
+        self._inflight = 0
+        self._drained = None
+        self._closing = False
+        self._latency_metric = None
+
+    async def _setup(self, app):
+        await super()._setup(app)
+        self._latency_metric = app.metrics.histogram(
+            'aiosvc_http_client_request_seconds', 'Time of outgoing http requests', ('client', )
+        ).labels(self._name)
+
+    async def _start(self):
+        self._closing = False
+        self._drained = asyncio.Event()
+        self._drained.set()
+        connector = aiohttp.TCPConnector(limit=self._limit, limit_per_host=self._limit_per_host,
+                                         ttl_dns_cache=self._ttl_dns_cache, keepalive_timeout=self._keepalive_timeout)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout, headers=self._headers,
+                                              **self._session_kwargs)
+        if self._warm_connections and self._base_url:
+            await asyncio.gather(*[self._warm() for _ in range(self._warm_connections)])
+
+    async def _warm(self):
+        try:
+            async with self.request('HEAD', self._warm_path):
+                pass
+        except Exception as e:
+            logger.warning('Http client "%s" failed to warm a connection: %s' % (self._name, e))
+
+    async def _before_stop(self):
+        # new requests are refused, running ones are awaited
+        self._closing = True
+        if self._drained is not None:
+            await self._drained.wait()
+
+    async def _stop(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _after_fork(self, loop):
+        super()._after_fork(loop)
+        self._session = None
+        self._drained = None
+
+    @property
+    def session(self):
+        """
+        :rtype: aiohttp.ClientSession
+        """
+        return self._session
+
+    @property
+    def inflight(self):
+        """
+        :return: number of running requests
+        """
+        return self._inflight
+
+    def url(self, url):
+        """
+        :return: absolute url, relative ones are joined with base_url
+        """
+        if self._base_url is None or '://' in url:
+            return url
+        return self._base_url + '/' + url.lstrip('/')
+
+    def request(self, method, url, **kwargs):
+        """
+        Usage:
+            async with client.request('GET', '/items', params={'id': 1}) as resp:
+                ...
+
+        :param kwargs: passed to aiohttp.ClientSession.request
+        """
+        return RequestContext(self, method, url, kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def _enter(self):
+        if self._session is None or self._closing:
+            raise UserWarning('Http client "%s" is not running' % (self._name, ))
+        self._inflight += 1
+        self._drained.clear()
+
+    def _exit(self, started):
+        self._inflight -= 1
+        if self._inflight == 0:
+            self._drained.set()
+        if self._latency_metric is not None:
+            self._latency_metric.observe(time.monotonic() - started)
+
+
+class RequestContext:
+
+    __slots__ = ('client', 'method', 'url', 'kwargs', 'response', 'started')
+
+    def __init__(self, client, method, url, kwargs):
+        self.client = client
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs
+        self.response = None
+        self.started = None
+
+    async def __aenter__(self):
+        """
+        :rtype: aiohttp.ClientResponse
+        """
+        self.client._enter()
+        self.started = time.monotonic()
+        try:
+            self.response = await self.client._session.request(self.method, self.client.url(self.url), **self.kwargs)
+        except BaseException:
+            self.client._exit(self.started)
+            raise
+        return self.response
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.response.release()
+        finally:
+            self.client._exit(self.started)
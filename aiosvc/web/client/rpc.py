@@ -0,0 +1,277 @@
+import time
+import asyncio
+import itertools
+
+from aiosvc.web.codec import json_codec
+from .breaker import CircuitBreaker, LatencyWindow
+from .client import Client
+
+
+class RpcClientError(Exception):
+    """
+    Error returned by the remote side of a call
+    """
+
+    def __init__(self, code, message=None, data=None):
+        super().__init__(code, message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+    def __str__(self):
+        return '%s: %s' % (self.code, self.message)
+
+
+class CircuitOpenError(RpcClientError):
+    """
+    Every endpoint is failing, the call was not sent
+    """
+
+    def __init__(self):
+        super().__init__(None, 'no available endpoint, circuits are open')
+
+
+class _Endpoint(object):
+
+    __slots__ = ('url', 'breaker')
+
+    def __init__(self, url, breaker):
+        self.url = url
+        self.breaker = breaker
+
+
+class JsonRpcClient(Client):
+    """
+    JSON-RPC client, calls issued within batch_window seconds are sent as one batch request
+
+    Examples:
+        app.attach('billing', JsonRpcClient('http://billing:8080/rpc', batch_window=0.002))
+
+        balance = await app.billing.call('get_balance', {'user_id': 1})
+
+    With several urls requests are spread over them round-robin, an endpoint which keeps failing is skipped by its
+    circuit breaker. With hedge_percentile a batch of idempotent calls which takes longer than that percentile of
+    recent latencies is sent again to another endpoint, the first successful answer wins. At most hedge_budget of
+    requests are hedged, so a slow cluster does not get twice the load.
+    """
+
+    # max number of hedges saved up by a quiet client
+    hedge_burst = 10
+
+    def __init__(self, url, batch_window=0.002, max_batch_size=100, codec=None, idempotent=(),
+                 hedge_percentile=None, hedge_min_samples=100, hedge_budget=0.1, failure_threshold=5, reset_timeout=10.0,
+                 **kwargs):
+        """
+        :param url: url of a JsonRpcHandler or a list of urls of its replicas
+        :param batch_window: seconds calls are collected before the batch is sent, 0 - until the next loop iteration
+        :param max_batch_size: a batch is sent at once when it reaches this size, 1 - batching is disabled
+        :param codec: aiosvc.web.codec codec, the fastest json codec by default
+        :param idempotent: names of methods which are safe to call twice, they may be hedged
+        :param hedge_percentile: latency percentile after which a request is hedged, e.g. 0.95, None - disabled
+        :param hedge_min_samples: number of observed latencies required before hedging starts
+        :param hedge_budget: max fraction of requests which are hedged
+        :param failure_threshold: consecutive failures of an endpoint which open its circuit
+        :param reset_timeout: seconds before a probe is sent to an endpoint with the open circuit
+        :param kwargs: passed to Client
+        """
+        super().__init__(**kwargs)
+        urls = [url] if isinstance(url, str) else list(url)
+        if not urls:
+            raise UserWarning('At least one url is required')
+        self._endpoints = [_Endpoint(u, CircuitBreaker(failure_threshold, reset_timeout)) for u in urls]
+        self._next_endpoint = 0
+        self._idempotent = frozenset(idempotent)
+        self._latency = LatencyWindow(hedge_percentile, min_samples=hedge_min_samples) if hedge_percentile else None
+        self._hedge_budget = hedge_budget
+        # hedges allowed now, every request adds hedge_budget of them
+        self._hedge_tokens = 0.0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._batch_window = batch_window
+        self._max_batch_size = max_batch_size
+        self._codec = codec or json_codec()
+        self._ids = itertools.count(1)
+        # calls waiting for the batch to be sent: (request, future)
+        self._pending = []
+        self._flush_handle = None
+        self._batches = set()
+
+    async def call(self, method, params=None, timeout=None, idempotent=None):
+        """
+        :param params: dict of named params
+        :param timeout: max time to wait for the result in seconds
+        :param idempotent: whether the call may be hedged, by default if the method is listed in idempotent
+        :raise RpcClientError: if the remote method failed
+        :raise CircuitOpenError: if no endpoint is available
+        """
+        if self._session is None or self._closing:
+            raise UserWarning('Http client "%s" is not running' % (self._name, ))
+        request = {"jsonrpc": "2.0", "id": next(self._ids), "method": method}
+        if params is not None:
+            request["params"] = params
+        if idempotent is None:
+            idempotent = method in self._idempotent
+        future = self._loop.create_future()
+        self._pending.append((request, future, idempotent))
+        if len(self._pending) >= self._max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(self._batch_window, self._flush)
+        if timeout is None:
+            return await future
+        return await asyncio.wait_for(future, timeout)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._send(batch))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _send(self, batch):
+        """
+        :param batch: list of (request, future, idempotent)
+        """
+        calls = [(request, future) for request, future, _ in batch if not future.done()]
+        if not calls:
+            return
+        hedge = self._latency is not None and all(idempotent for _, future, idempotent in batch if not future.done())
+        try:
+            data = await self._post([request for request, _ in calls], hedge)
+        except Exception as e:
+            for _, future in calls:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self._resolve(calls, data)
+
+    async def _post(self, requests, hedge=False):
+        """
+        :param hedge: whether the requests may be sent to another endpoint when the first one is slow
+        :return: decoded response body
+        """
+        body = self._codec.dumps(requests if len(requests) > 1 else requests[0])
+        endpoint = self._endpoint()
+        if endpoint is None:
+            raise CircuitOpenError()
+        delay = self._latency.value if hedge else None
+        if delay is not None:
+            self._hedge_tokens = min(self._hedge_tokens + self._hedge_budget, self.hedge_burst)
+        if delay is None or len(self._endpoints) < 2:
+            data, _ = await self._post_to(endpoint, body)
+            return data
+
+        first = asyncio.ensure_future(self._post_to(endpoint, body))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or self._hedge_tokens < 1:
+                data, _ = await first
+                return data
+            second = self._endpoint(exclude=endpoint)
+            if second is None:
+                data, _ = await first
+                return data
+            self._hedge_tokens -= 1
+            self.hedged += 1
+            tasks.append(asyncio.ensure_future(self._post_to(second, body)))
+            pending = set(tasks)
+            # a failed answer wins only if the other request fails too
+            failed = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+                    data, task_failed = task.result()
+                    if not task_failed:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return data
+                    if failed is None:
+                        failed = data
+            if failed is not None:
+                return failed
+            return first.result()[0]
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _post_to(self, endpoint, body):
+        """
+        :type endpoint: _Endpoint
+        :return: (decoded response body, whether the endpoint failed)
+        :rtype: tuple
+        """
+        started = time.monotonic()
+        try:
+            async with self.post(endpoint.url, data=body, headers={'Content-Type': self._codec.content_type}) as resp:
+                data = self._codec.loads(await resp.read())
+                failed = resp.status >= 500
+        except asyncio.CancelledError:
+            endpoint.breaker.cancel()
+            # the latency of a hedge loser is at least the time it ran, without it the slow tail is never observed
+            if self._latency is not None:
+                self._latency.observe(time.monotonic() - started)
+            raise
+        except Exception:
+            endpoint.breaker.failure()
+            raise
+        if failed:
+            endpoint.breaker.failure()
+        else:
+            endpoint.breaker.success()
+            if self._latency is not None:
+                self._latency.observe(time.monotonic() - started)
+        return data, failed
+
+    def _endpoint(self, exclude=None):
+        """
+        :return: next endpoint whose circuit lets a request through
+        :rtype: _Endpoint | None
+        """
+        for _ in range(len(self._endpoints)):
+            endpoint = self._endpoints[self._next_endpoint]
+            self._next_endpoint = (self._next_endpoint + 1) % len(self._endpoints)
+            if endpoint is not exclude and endpoint.breaker.allow():
+                return endpoint
+        return None
+
+    @staticmethod
+    def _resolve(calls, data):
+        if not isinstance(data, list):
+            data = [data]
+        responses = {}
+        for response in data:
+            if isinstance(response, dict):
+                responses[response.get("id")] = response
+        # an error not bound to a call (malformed or rejected batch) fails every call
+        rejected = responses.get(None)
+        for request, future in calls:
+            if future.done():
+                continue
+            response = responses.get(request["id"], rejected)
+            if response is None:
+                future.set_exception(RpcClientError(None, 'no response for call "%s"' % request["method"]))
+            elif response.get("error") is not None:
+                error = response["error"]
+                future.set_exception(RpcClientError(error.get("code"), error.get("message"), error.get("data")))
+            else:
+                future.set_result(response.get("result"))
+
+    async def _before_stop(self):
+        self._flush()
+        if self._batches:
+            await asyncio.wait(list(self._batches))
+        await super()._before_stop()
+
+    def _after_fork(self, loop):
+        super()._after_fork(loop)
+        self._pending = []
+        self._flush_handle = None
+        self._batches = set()
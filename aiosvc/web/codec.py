@@ -0,0 +1,127 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+class JsonCodec(object):
+    """
+    Stdlib json codec, used when no faster implementation is installed.
+    Codecs decode bytes and encode to bytes, so the body is never copied into an intermediate str.
+    """
+
+    content_type = 'application/json'
+    # other content types of bodies accepted
+    aliases = ()
+    charset = 'utf-8'
+    # exceptions raised by loads() on malformed input
+    decode_errors = (ValueError, )
+
+    def __init__(self, indent=None):
+        self._indent = indent
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps(self, obj):
+        return json.dumps(obj, indent=self._indent).encode()
+
+    # framing of an array written item by item
+    def array_start(self, length):
+        return b'['
+
+    array_separator = b','
+    array_end = b']'
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    Non-str dict keys are converted like stdlib does, values orjson can not encode (e.g. integers beyond 64 bits)
+    are encoded by stdlib json. Datetimes and dataclasses are passed to stdlib as well, so they fail the same way.
+
+    Differences from stdlib which remain: NaN and +-Infinity are encoded as null instead of NaN and Infinity, UUID
+    and Enum members are encoded instead of raising TypeError.
+    """
+
+    def __init__(self, indent=None):
+        super().__init__(indent=indent)
+        self._option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | \
+            orjson.OPT_PASSTHROUGH_DATACLASS | (orjson.OPT_INDENT_2 if indent else 0)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+    def dumps(self, obj):
+        try:
+            return orjson.dumps(obj, option=self._option)
+        except TypeError:
+            return super().dumps(obj)
+
+
+class UjsonCodec(JsonCodec):
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+    def dumps(self, obj):
+        try:
+            return ujson.dumps(obj, ensure_ascii=False, indent=self._indent or 0).encode()
+        except (TypeError, OverflowError):
+            return super().dumps(obj)
+
+
+class MsgpackCodec(object):
+
+    content_type = 'application/msgpack'
+    aliases = ('application/x-msgpack', )
+    charset = None
+    decode_errors = (ValueError, )
+
+    def loads(self, data):
+        return msgpack.unpackb(data, raw=False)
+
+    def dumps(self, obj):
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def array_start(self, length):
+        return msgpack.Packer().pack_array_header(length)
+
+    array_separator = b''
+    array_end = b''
+
+
+def json_codec(indent=None):
+    """
+    :param indent: indentation of output, stdlib codec is used to keep it exactly as given
+    :return: the fastest available json codec
+    :rtype: JsonCodec
+    """
+    if indent is not None:
+        return JsonCodec(indent=indent)
+    if orjson is not None:
+        return OrjsonCodec()
+    if ujson is not None:
+        return UjsonCodec()
+    return JsonCodec()
+
+
+def msgpack_codec():
+    """
+    :return: msgpack codec if msgpack is installed
+    :rtype: MsgpackCodec | None
+    """
+    if msgpack is None:
+        return None
+    return MsgpackCodec()
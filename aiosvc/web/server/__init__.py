@@ -1,4 +1,6 @@
 from .server import Server
 from .simple import SimpleHandler
+from .metrics import MetricsHandler
+from .static import StaticHandler
 from aiosvc.web.server.rpc.rest import RestRpcHandler
 # from aiosvc.web.server.rpc.rest import JsonRpcHandler
\ No newline at end of file
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from collections import deque
+
+
+logger = logging.getLogger("aiosvc")
+
+
+class Admission(object):
+    """
+    Limits the number of concurrently handled requests. Requests over the limit wait in a bounded queue, requests
+    which do not fit the queue, wait longer than queue_timeout or arrive while any of the overload checks fires are
+    shed immediately.
+    """
+
+    def __init__(self, limit: int = None, queue_size: int = 0, queue_timeout: float = None, checks=None,
+                 retry_after: int = 1):
+        """
+        :param limit: max number of concurrent requests, None - unlimited
+        :param queue_size: max number of requests waiting for a free slot
+        :param queue_timeout: max time in seconds a request waits in the queue
+        :param checks: callables returning True when the service is overloaded
+        :param retry_after: value of Retry-After header of shed responses
+        """
+        self._limit = limit
+        self._queue_size = queue_size
+        self._queue_timeout = queue_timeout
+        self._checks = list(checks or ())
+        self.retry_after = retry_after
+        self._waiters = deque()
+        self.in_flight = 0
+        self.shed = 0
+
+    def register_metrics(self, registry, name):
+        """
+        :type registry: aiosvc.metrics.Registry
+        :param name: value of "admission" label
+        """
+        registry.gauge('aiosvc_http_in_flight', 'Requests being handled', ('admission', )
+                       ).labels(name).set_function(lambda: self.in_flight)
+        registry.gauge('aiosvc_http_queued', 'Requests waiting for a free slot', ('admission', )
+                       ).labels(name).set_function(lambda: self.queued)
+        registry.gauge('aiosvc_http_shed', 'Requests rejected because of overload', ('admission', )
+                       ).labels(name).set_function(lambda: self.shed)
+
+    def add_check(self, check):
+        self._checks.append(check)
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "shed": self.shed,
+        }
+
+    async def acquire(self):
+        """
+        :return: False if the request must be shed, otherwise the slot must be released after the request
+        :rtype: bool
+        """
+        for check in self._checks:
+            if check():
+                self.shed += 1
+                return False
+        if self._limit is None or (self.in_flight < self._limit and not self._waiters):
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self._queue_size:
+            self.shed += 1
+            return False
+
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            if self._queue_timeout is None:
+                await waiter
+            else:
+                await asyncio.wait_for(asyncio.shield(waiter), self._queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # the slot was handed over right at the timeout
+                return True
+            waiter.cancel()
+            self.shed += 1
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            waiter.cancel()
+            raise
+        finally:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+        return True
+
+    def release(self):
+        # hand the slot over to the first waiter, in_flight stays the same
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+class LoopLagMonitor(object):
+    """
+    Measures how late the event loop wakes up a sleeping coroutine
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float = .1):
+        self._loop = loop
+        self._interval = interval
+        self._task = None
+        self.lag = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = self._loop.time()
+            await asyncio.sleep(self._interval)
+            self.lag = max(self._loop.time() - started - self._interval, 0.0)
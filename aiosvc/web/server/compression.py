@@ -0,0 +1,73 @@
+import zlib
+
+
+# supported content codings in order of preference
+_encodings = ('gzip', 'deflate')
+
+
+def accepted_encoding(accept_encoding):
+    """
+    :param accept_encoding: value of Accept-Encoding header
+    :return: the preferred supported coding accepted by the client
+    :rtype: str | None
+    """
+    if not accept_encoding:
+        return None
+    # coding -> its quality, an explicitly listed coding is not matched by *
+    qualities = {}
+    for item in accept_encoding.lower().split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        if params:
+            name, _, value = params.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    continue
+        qualities[coding.strip()] = quality
+    for encoding in _encodings:
+        if qualities.get(encoding, qualities.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding, level=6):
+    """
+    :type data: bytes
+    :param encoding: gzip or deflate
+    :rtype: bytes
+    """
+    wbits = 16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS
+    compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+    return compressor.compress(data) + compressor.flush()
+
+
+def is_compressed(data, encoding):
+    """
+    Checks the magic of the data, the http server may have decoded the body already
+    """
+    if encoding == 'gzip':
+        return data[:2] == b'\x1f\x8b'
+    if encoding == 'deflate':
+        return len(data) >= 2 and (data[0] & 0x0f) == 8 and ((data[0] << 8) | data[1]) % 31 == 0
+    return False
+
+
+def decompress(data, encoding, max_size):
+    """
+    :param max_size: max size of the decompressed data
+    :raise ValueError: if the data is malformed, truncated or too large
+    :rtype: bytes
+    """
+    wbits = 16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS
+    decompressor = zlib.decompressobj(wbits)
+    try:
+        result = decompressor.decompress(data, max_size)
+    except zlib.error as e:
+        raise ValueError('malformed %s body: %s' % (encoding, e))
+    if decompressor.unconsumed_tail:
+        raise ValueError('decompressed body exceeds %s bytes' % max_size)
+    if not decompressor.eof:
+        raise ValueError('truncated %s body' % encoding)
+    return result
@@ -0,0 +1,16 @@
+from aiohttp.web import Response
+
+from .simple import SimpleHandler
+
+
+class MetricsHandler(SimpleHandler):
+    """
+    Exposes application metrics in Prometheus text format
+    """
+
+    def __init__(self, route='/metrics', methods=None, **kwargs):
+        super().__init__(route, methods=methods, **kwargs)
+
+    async def handle(self, request):
+        return Response(body=self.app.metrics.expose().encode(),
+                        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
@@ -1,3 +1,5 @@
 from .json import JsonRpcHandler
-from .rest import RestRpcHandler
-from .base import RpcError
\ No newline at end of file
+from .rest import RestRpcHandler, route
+from .ws import WsJsonRpcHandler
+from .base import RpcError
+from .cache import cached
@@ -1,18 +1,88 @@
+import time
+import json
+import random
 import asyncio
+import inspect
+import logging
+import traceback
 import types
+import typing
 import aiosvc
 from aiosvc.web.server import SimpleHandler
+from aiosvc.web.server import compression
+from aiosvc.web.codec import json_codec, msgpack_codec
+from .cache import MethodCache
+from .coerce import compile_coercer
+from .reqlog import RequestLog
 from aiohttp import web
+from aiohttp.web_protocol import RequestPayloadError
+
+
+logger = logging.getLogger("aiosvc.rpc")
+
+
+class _LogRecord(object):
+    """
+    Logged fields of a request, the request itself is not kept in the log queue
+    """
+
+    __slots__ = ('method', 'path', 'raw_headers', 'body', 'duration', 'status', 'response_body', 'error',
+                 'traceback')
+
+    def __init__(self, method, path, raw_headers, body, duration):
+        self.method = method
+        self.path = path
+        self.raw_headers = raw_headers
+        self.body = body
+        self.duration = duration
+        self.status = None
+        self.response_body = None
+        self.error = None
+        self.traceback = None
 
 
 class RpcHandler(SimpleHandler):
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, codec=None, **kwargs):
+        """
+        :param codec: body codec, the fastest available json codec by default
+        :type codec: aiosvc.web.codec.JsonCodec
+        """
         super().__init__(*args, **kwargs)
+        self._codec = codec
+        # content type -> codec, negotiated per request
+        self._codecs = {}
+        # compress responses larger than this number of bytes if the client accepts gzip/deflate, None - disabled
+        self._compress_min_size = None
+        self._compress_level = 6
+        # bodies larger than this number of bytes are (de)compressed in the default executor
+        self._compress_executor_size = 64 * 1024
+        # max size of a decompressed request body
+        self._max_request_size = 16 * 1024 * 1024
+        # format output, e.g. ' ' * 4 (forces stdlib json codec)
+        self._json_indent = None
         # raise exception if caught unexpected parameter
         self._error_on_non_exist_params = True
         # logging: 0 - disabled, 1 - errors only, 2 - all requests
         self._logging = 0
+        # share of successful requests logged with _logging = 2
+        self._log_sample_rate = 1.0
+        # requests slower than this number of seconds are logged with any _logging > 0
+        self._log_slow_time = None
+        # max number of records waiting for flush, others are dropped
+        self._log_queue_size = 10000
+        self._log_batch_size = 100
+        self._log_flush_interval = 1.0
+        # logged request and response bodies are cut to this number of bytes, None - unlimited
+        self._log_body_size = 4096
+        self._request_log = None
+        # public methods compiled at setup
+        self._dispatch = types.MappingProxyType({})
+        self._has_before_call = True
+        # share one execution between identical concurrent calls: True - all methods, or a set of method names
+        self._coalesce_calls = False
+        # (method name, params key) -> task of the shared execution
+        self._inflight = {}
 
     async def _before_call(self, method, params, request):
         return method, params
@@ -20,15 +90,144 @@ class RpcHandler(SimpleHandler):
     async def _handle_request(self, request):
         return web.Response(body=b'')
 
+    async def _respnse(self, body, codec=None, request=None):
+        codec = codec or self._codec
+        data = codec.dumps(body)
+        if self._request_log is not None and request is not None:
+            # logged before compression
+            request["rpc_response_body"] = data
+        headers = None
+        if self._compress_min_size is not None and request is not None:
+            headers = {'Vary': 'Accept-Encoding'}
+            encoding = self._response_encoding(request, len(data))
+            if encoding is not None:
+                data = await self._run_sized(len(data), compression.compress, data, encoding, self._compress_level)
+                headers['Content-Encoding'] = encoding
+        return web.Response(body=data, content_type=codec.content_type, charset=codec.charset, headers=headers)
+
+    def _response_encoding(self, request, size):
+        if self._compress_min_size is None or size < self._compress_min_size:
+            return None
+        return compression.accepted_encoding(request.headers.get('Accept-Encoding'))
+
+    async def _run_sized(self, size, func, *args):
+        # keep (de)compression of large bodies off the event loop
+        if size >= self._compress_executor_size:
+            return await self._loop.run_in_executor(None, func, *args)
+        return func(*args)
+
+    def _dumps(self, data, codec=None):
+        return (codec or self._codec).dumps(data)
+
+    def _request_codec(self, request):
+        return self._codecs.get(request.content_type, self._codec)
+
+    def _response_codec(self, request, request_codec):
+        accept = request.headers.get('Accept')
+        if accept:
+            for media_range in accept.split(','):
+                codec = self._codecs.get(media_range.split(';', 1)[0].strip())
+                if codec is not None:
+                    return codec
+        return request_codec
+
+    async def _read_body(self, request):
+        """
+        :raise RpcError: if the body is compressed and can not be decompressed
+        """
+        try:
+            body = await request.read()
+        except RequestPayloadError as e:
+            # body was decoded by aiohttp according to Content-Encoding
+            raise RpcError(RpcError.RPC_ERR_PARSE, details=str(e))
+        encoding = request.headers.get('Content-Encoding', '').lower()
+        if encoding and compression.is_compressed(body, encoding):
+            try:
+                body = await self._run_sized(len(body), compression.decompress, body, encoding,
+                                             self._max_request_size)
+            except ValueError as e:
+                raise RpcError(RpcError.RPC_ERR_PARSE, details=str(e))
+        request["rpc_body"] = body
+        return body
+
+    async def _dispatch_request(self, request):
+        if self._request_log is None:
+            return await super()._dispatch_request(request)
+        started = time.monotonic()
+        response = error = None
+        try:
+            response = await super()._dispatch_request(request)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._log_request(request, response, error, time.monotonic() - started)
+
+    def _log_error(self, request, e):
+        """
+        Marks the request as failed for logging, errors of rpc calls do not fail the http request
+        """
+        if self._request_log is not None and request is not None:
+            request["rpc_error"] = e
+
+    def _log_request(self, request, response, error, duration):
+        # the record keeps only what is logged, it is formatted by the background flush
+        if error is None:
+            error = request.get("rpc_error")
+        if error is None and (self._log_slow_time is None or duration < self._log_slow_time):
+            if self._logging < 2 or (self._log_sample_rate < 1 and random.random() >= self._log_sample_rate):
+                return
+        record = _LogRecord(request.method, request.path, request.raw_headers,
+                            self._log_body(request.get("rpc_body")), duration)
+        if response is not None:
+            record.status = response.status
+            body = request.get("rpc_response_body")
+            if body is None:
+                body = getattr(response, "body", None)
+            if isinstance(body, (bytes, bytearray)):
+                record.response_body = self._log_body(body)
+        if error is not None:
+            record.error = str(error)
+            if not isinstance(error, RpcError):
+                # frames of the traceback are not kept
+                record.traceback = traceback.TracebackException(type(error), error, error.__traceback__,
+                                                                lookup_lines=False)
+        self._request_log.put(record)
+
+    def _log_body(self, body):
+        if body is None or self._log_body_size is None or len(body) <= self._log_body_size:
+            return body
+        return bytes(body[:self._log_body_size]) + b'...'
+
+    async def _write_log(self, records):
+        for record in records:
+            log_data = self._get_request_log_data(record, record.body)
+            log_data["request_method"] = record.method
+            log_data["duration"] = round(record.duration, 6)
+            if record.status is not None:
+                log_data["response_status"] = record.status
+                if record.response_body is not None:
+                    log_data["response_body"] = self._utf_decode(record.response_body)
+            if record.error is not None:
+                log_data["error"] = record.error
+                if record.traceback is not None:
+                    log_data["traceback"] = "".join(record.traceback.format())
+            await self._log(log_data)
+
     async def _log(self, log_data):
-        import json
-        # print(json.dumps(log_data, indent='    '))
-        pass
+        if log_data.get("error") is not None:
+            logger.error(json.dumps(log_data, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(log_data, ensure_ascii=False))
 
     def _get_request_log_data(self, request, body):
+        """
+        :param request: aiohttp request or a _LogRecord of it, both have path and raw_headers
+        """
         if self._logging > 0:
             return {
-                "request_body": self._utf_decode(body),
+                "request_body": self._utf_decode(body) if body is not None else None,
                 "request_headers": "\n".join(
                     [self._utf_decode(line[0]) + ": " + self._utf_decode(line[1]) for line in request.raw_headers]),
                 "request_uri": request.path
@@ -43,63 +242,225 @@ class RpcHandler(SimpleHandler):
         except Exception:
             return str(bytes)
 
+    async def _setup(self, loop, app, server, http_app):
+        if self._codec is None:
+            self._codec = json_codec(self._json_indent)
+        # the handler codec wins content type conflicts
+        for codec in (msgpack_codec(), self._codec):
+            if codec is not None:
+                for content_type in (codec.content_type, ) + codec.aliases:
+                    self._codecs[content_type] = codec
+        self._dispatch = self._build_dispatch(app)
+        # skip awaiting of the default pass-through hook
+        self._has_before_call = type(self)._before_call is not RpcHandler._before_call
+        if self._logging > 0 and self._request_log is None:
+            self._request_log = RequestLog(self._write_log, queue_size=self._log_queue_size,
+                                           batch_size=self._log_batch_size, flush_interval=self._log_flush_interval)
+            self._request_log.start(loop)
+        await super()._setup(loop, app, server, http_app)
+
+    async def _stop(self):
+        await super()._stop()
+        if self._request_log is not None:
+            await self._request_log.stop()
+
+    def _build_dispatch(self, app):
+        """
+        :type app: aiosvc.Application
+        :return: immutable mapping of public method names to their call plans
+        :rtype: types.MappingProxyType
+        """
+        plans = {}
+        for name in dir(self):
+            if name[0:1] == "_" or isinstance(getattr(type(self), name, None), property):
+                continue
+            method = getattr(self, name)
+            if isinstance(method, (types.MethodType, types.FunctionType)):
+                plans[name] = plan = MethodPlan(name, method)
+                if app is not None:
+                    plan.calls = app.metrics.counter(
+                        'aiosvc_rpc_calls_total', 'Calls of rpc methods', ('handler', 'method')
+                    ).labels(self._route, name)
+                    plan.errors = app.metrics.counter(
+                        'aiosvc_rpc_errors_total', 'Failed calls of rpc methods', ('handler', 'method')
+                    ).labels(self._route, name)
+                    plan.latency = app.metrics.histogram(
+                        'aiosvc_rpc_call_seconds', 'Duration of rpc method calls', ('handler', 'method')
+                    ).labels(self._route, name)
+                plan.coalesce = self._coalesce_calls is True or bool(self._coalesce_calls and
+                                                                     name in self._coalesce_calls)
+                cache_options = getattr(method, '_rpc_cache', None)
+                if cache_options is not None:
+                    redis = getattr(app, cache_options["redis"]) if cache_options["redis"] else None
+                    plan.cache = MethodCache(name, self._codec, ttl=cache_options["ttl"],
+                                             maxsize=cache_options["maxsize"], redis=redis,
+                                             local_ttl=cache_options["local_ttl"])
+        return types.MappingProxyType(plans)
+
+    def _get_plan(self, method_name):
+        try:
+            return self._dispatch[method_name]
+        except KeyError:
+            pass
+        if method_name[0:1] == "_":
+            raise RpcError(RpcError.RPC_ERR_METHOD_NOT_FOUND,
+                           details='attempt to call private method "%s"' % method_name)
+        raise RpcError(RpcError.RPC_ERR_METHOD_NOT_FOUND, details='method "%s" not found' % method_name)
+
     @staticmethod
     async def _call_method(obj, method_name, params, request, error_on_non_exist_params):
-        method = RpcHandler._get_method(obj, method_name)
+        plan = obj._get_plan(method_name)
         if params is None:
             params = {}
         if not isinstance(params, dict):
             raise RpcError(RpcError.RPC_ERR_INVALID_PARAMS_FORMAT, details="params is not instance of dict")
-        kwargs = RpcHandler._get_params(method, params, error_on_non_exist_params)
-        if hasattr(obj, '_before_call'):
-            method, kwargs = await obj._before_call(method, kwargs, request)
-        # print(method, type(method))
+        return await obj._call_measured(plan, params, request, error_on_non_exist_params)
+
+    async def _call_measured(self, plan, params, request, error_on_non_exist_params):
+        if plan.latency is None:
+            return await self._call_plan(plan, params, request, error_on_non_exist_params)
+        plan.calls.inc()
+        started = time.perf_counter()
+        try:
+            return await self._call_plan(plan, params, request, error_on_non_exist_params)
+        except Exception:
+            plan.errors.inc()
+            raise
+        finally:
+            plan.latency.observe(time.perf_counter() - started)
+
+    async def _call_plan(self, plan, params, request, error_on_non_exist_params):
+        kwargs = plan.bind(params, error_on_non_exist_params)
+        method = plan.method
+        if self._has_before_call:
+            method, kwargs = await self._before_call(method, kwargs, request)
+        if (plan.cache is None and not plan.coalesce) or method != plan.method:
+            return await self._invoke(method, kwargs)
+        key = MethodCache.key(kwargs)
+        if plan.cache is not None:
+            found, result = await plan.cache.get(key)
+            if found:
+                return result
+        if plan.coalesce:
+            return await self._coalesced_invoke(plan, kwargs, key)
+        return await self._cached_invoke(plan, kwargs, key)
+
+    async def _cached_invoke(self, plan, kwargs, key):
+        result = await self._invoke(plan.method, kwargs)
+        if plan.cache is not None:
+            await plan.cache.set(key, result)
+        return result
+
+    async def _coalesced_invoke(self, plan, kwargs, key):
+        """
+        Identical concurrent calls await one shared execution. It is shielded, so a caller going away does not
+        cancel it for the others.
+        """
+        flight_key = (plan.name, key)
+        task = self._inflight.get(flight_key)
+        if task is None:
+            task = asyncio.ensure_future(self._cached_invoke(plan, kwargs, key))
+            self._inflight[flight_key] = task
+
+            def done(task):
+                if self._inflight.get(flight_key) is task:
+                    del self._inflight[flight_key]
+                # mark the exception retrieved even if every caller has gone
+                if not task.cancelled():
+                    task.exception()
+
+            task.add_done_callback(done)
+        return await asyncio.shield(task)
+
+    @staticmethod
+    async def _invoke(method, kwargs):
         result = method(**kwargs)
         if asyncio.iscoroutine(result):
             return await result
         return result
 
-    @staticmethod
-    def _get_method(obj, method_name):
-        # private methods
-        if method_name[0:1] == "_":
-            raise RpcError(RpcError.RPC_ERR_METHOD_NOT_FOUND,
-                           details='attempt to call private method "%s"' % method_name)
+    async def _invalidate_cache(self, method_name, params=None):
+        """
+        :param params: params of the call to forget, all cached calls of the method if None
+        :type params: dict | None
+        """
+        plan = self._get_plan(method_name)
+        if plan.cache is None:
+            raise UserWarning('Method "%s" is not cached' % method_name)
+        if params is not None:
+            params = plan.bind(params, False)
+        await plan.cache.invalidate(params)
+
+    def _cache_stats(self):
+        """
+        :return: hit/miss counters of every cached method
+        :rtype: dict
+        """
+        return {name: plan.cache.stats() for name, plan in self._dispatch.items() if plan.cache is not None}
+
+
+class MethodPlan(object):
+    """
+    Call plan of a rpc method compiled once at handler setup: the bound method and its parameters
+    """
+
+    __slots__ = ('name', 'method', 'params', 'var_kwargs', 'cache', 'coalesce', 'calls', 'errors', 'latency')
+
+    def __init__(self, name, method):
+        self.name = name
+        self.method = method
+        self.var_kwargs = False
+        # aiosvc.web.server.rpc.cache.MethodCache of the method decorated with @cached
+        self.cache = None
+        # share one execution between identical concurrent calls
+        self.coalesce = False
+        # metrics of the method, set if the handler belongs to an application
+        self.calls = None
+        self.errors = None
+        self.latency = None
         try:
-            method = getattr(obj, method_name)
-        except AttributeError:
-            raise RpcError(RpcError.RPC_ERR_METHOD_NOT_FOUND,
-                           details='method "%s" not found' % method_name)
-        if not isinstance(method, types.MethodType) and not isinstance(method, types.FunctionType):
-            raise RpcError(RpcError.RPC_ERR_METHOD_NOT_FOUND,
-                           details='method "%s" is not callable' % method_name)
-        return method
+            hints = typing.get_type_hints(method)
+        except Exception:
+            hints = {}
+        params = []
+        for param in inspect.signature(method).parameters.values():
+            if param.kind == param.VAR_KEYWORD:
+                self.var_kwargs = True
+            elif param.kind != param.VAR_POSITIONAL:
+                coerce = compile_coercer(hints.get(param.name), param.default is None)
+                params.append((param.name, param.default is param.empty, param.default, coerce))
+        # tuples of (name, required, default, coercer or None)
+        self.params = tuple(params)
 
-    @staticmethod
-    def _get_params(method, called_params, error_on_non_exist_params):
+    def bind(self, called_params, error_on_non_exist_params):
+        """
+        :type called_params: dict
+        :rtype: dict
+        """
         kwargs = {}
-        varcount = method.__code__.co_argcount + method.__code__.co_kwonlyargcount
-        varnames = list(method.__code__.co_varnames)[0:varcount]
-
-        defaults = method.__defaults__
-        defautts_pos = len(varnames) - len(defaults or ())
-        # remove "self"(first var)
-        if isinstance(method, types.MethodType):
-            varnames.pop(0)
-            defautts_pos -= 1
-        for pos in range(len(varnames)):
-            kwarg = varnames[pos]
-            try:
-                kwargs[kwarg] = called_params.pop(kwarg)
-            except KeyError:
-                if pos >= defautts_pos:
-                    kwargs[kwarg] = defaults[pos - defautts_pos]
+        given = 0
+        for name, required, default, coerce in self.params:
+            if name in called_params:
+                if coerce is None:
+                    kwargs[name] = called_params[name]
                 else:
-                    print(pos, kwarg, defautts_pos, varnames)
-                    raise RpcError(RpcError.RPC_ERR_INVALID_PARAMS, details='parameter "%s" not given' % kwarg)
-        if error_on_non_exist_params and len(called_params) > 0:
-            raise RpcError(RpcError.RPC_ERR_INVALID_PARAMS,
-                           details='got unexpected parameter(s): %s' % (", ".join(called_params)))
+                    try:
+                        kwargs[name] = coerce(called_params[name])
+                    except (ValueError, TypeError) as e:
+                        raise RpcError(RpcError.RPC_ERR_INVALID_PARAMS, details='parameter "%s": %s' % (name, e))
+                given += 1
+            elif required:
+                raise RpcError(RpcError.RPC_ERR_INVALID_PARAMS, details='parameter "%s" not given' % name)
+            else:
+                kwargs[name] = default
+        if given < len(called_params):
+            if self.var_kwargs:
+                for name, value in called_params.items():
+                    kwargs.setdefault(name, value)
+            elif error_on_non_exist_params:
+                raise RpcError(RpcError.RPC_ERR_INVALID_PARAMS,
+                               details='got unexpected parameter(s): %s' % (
+                                   ", ".join(name for name in called_params if name not in kwargs)))
         return kwargs
 
 
@@ -111,6 +472,8 @@ class RpcError(Exception):
     RPC_ERR_INVALID_PARAMS_FORMAT = 4
     RPC_ERR_INVALID_PARAMS = 4
     RPC_ERR_INTERNAL_ERROR = 5
+    RPC_ERR_TIMEOUT = 6
+    RPC_ERR_OVERLOADED = 7
 
     def __init__(self, code, message=None, details=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
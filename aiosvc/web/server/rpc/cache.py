@@ -0,0 +1,151 @@
+import json
+import logging
+
+from aiosvc.lru import LruCache
+
+
+logger = logging.getLogger("aiosvc")
+
+_missing = object()
+
+
+def cached(ttl: float = None, maxsize: int = 1024, redis: str = None, local_ttl: float = 1.0):
+    """
+    Caches results of an idempotent rpc method, keyed on the method name and its bound params
+
+    Examples:
+        class Handler(JsonRpcHandler):
+
+            @cached(ttl=60, redis='redis')
+            async def get_item(self, id):
+                ...
+
+    :param ttl: lifetime of an entry in seconds, None - until evicted
+    :param maxsize: max number of in-process entries, the least recently used ones are evicted
+    :param redis: name of an application aiosvc.db.redis.Pool component used as a second (shared) tier
+    :param local_ttl: max lifetime of an in-process entry with the redis tier, invalidation reaches other processes
+                      within it
+    """
+    if redis is not None and local_ttl is None:
+        raise UserWarning('local_ttl is required with redis, other processes would never see invalidations')
+
+    def decorator(func):
+        func._rpc_cache = {"ttl": ttl, "maxsize": maxsize, "redis": redis, "local_ttl": local_ttl}
+        return func
+    return decorator
+
+
+class MethodCache(object):
+    """
+    Results of one rpc method: in-process LRU with TTL and an optional redis tier.
+    With redis, in-process entries live at most local_ttl seconds, so an invalidation is seen by every process
+    within it.
+    """
+
+    def __init__(self, name, codec, ttl=None, maxsize=1024, redis=None, prefix='aiosvc:rpc:', local_ttl=1.0):
+        """
+        :type codec: aiosvc.web.codec.JsonCodec
+        :type redis: aiosvc.db.redis.Pool
+        """
+        if redis is not None and local_ttl is None:
+            raise UserWarning('local_ttl is required with redis, other processes would never see invalidations')
+        self._name = name
+        self._codec = codec
+        self._ttl = ttl
+        if redis is not None:
+            local_ttl = local_ttl if ttl is None else min(ttl, local_ttl)
+        else:
+            local_ttl = ttl
+        self._redis = redis
+        self._prefix = prefix + name + ':'
+        self._entries = LruCache(maxsize, local_ttl)
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(params):
+        """
+        :type params: dict
+        :rtype: str
+        """
+        return json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+
+    async def get(self, key):
+        """
+        :return: (found, value)
+        :rtype: tuple
+        """
+        value = self._entries.get(key, _missing)
+        if value is not _missing:
+            self.hits += 1
+            return True, value
+
+        if self._redis is not None:
+            try:
+                data = await self._redis.execute('get', self._prefix + key)
+            except Exception as e:
+                logger.error('Rpc cache "%s" redis get failed: %s' % (self._name, e))
+                data = None
+            if data is not None:
+                value = self._codec.loads(data)
+                self._entries.set(key, value)
+                self.redis_hits += 1
+                return True, value
+
+        self.misses += 1
+        return False, None
+
+    async def set(self, key, value):
+        self._entries.set(key, value)
+        if self._redis is not None:
+            try:
+                # e.g. bytes of msgpack clients, such a value is cached in process only
+                data = self._codec.dumps(value)
+            except Exception as e:
+                logger.warning('Rpc cache "%s" value is not stored in redis: %s' % (self._name, e))
+                return
+            args = ['set', self._prefix + key, data]
+            if self._ttl is not None:
+                args += ['px', max(int(self._ttl * 1000), 1)]
+            try:
+                await self._redis.execute(*args)
+            except Exception as e:
+                logger.error('Rpc cache "%s" redis set failed: %s' % (self._name, e))
+
+    async def invalidate(self, params=None):
+        """
+        :param params: bound params of a call to forget, all entries of the method if None
+        :type params: dict | None
+        """
+        if params is not None:
+            key = self.key(params)
+            self._entries.pop(key, None)
+            if self._redis is not None:
+                try:
+                    await self._redis.execute('del', self._prefix + key)
+                except Exception as e:
+                    logger.error('Rpc cache "%s" redis del failed: %s' % (self._name, e))
+            return
+
+        self._entries.clear()
+        if self._redis is not None:
+            try:
+                cursor = b'0'
+                while True:
+                    cursor, keys = await self._redis.execute('scan', cursor, 'match', self._prefix + '*',
+                                                             'count', 1000)
+                    if keys:
+                        await self._redis.execute('del', *keys)
+                    if cursor in (b'0', 0, '0'):
+                        break
+            except Exception as e:
+                logger.error('Rpc cache "%s" redis invalidation failed: %s' % (self._name, e))
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,189 @@
+import enum
+import types
+import typing
+
+try:
+    import dataclasses
+except ImportError:  # pragma: no cover
+    dataclasses = None
+
+
+# "X | None" annotations of python 3.10+
+_union_type = getattr(types, 'UnionType', None)
+
+_true = {'true', '1', 'yes', 'on'}
+_false = {'false', '0', 'no', 'off'}
+
+
+class QueryValue(str):
+    """
+    Value of a query string parameter, a list parameter accepts it as comma separated items
+    """
+
+    __slots__ = ()
+
+
+def compile_coercer(annotation, optional=False):
+    """
+    Compiles a parameter annotation into a function validating and converting a given value.
+    The function raises ValueError or TypeError on bad input. Strings are accepted for scalars, so query string
+    parameters are coerced too, lists accept comma separated QueryValue strings.
+
+    Supported: int, float, bool, str, list, dict, Enum, dataclass, typing.List[X], typing.Optional[X]
+
+    :param optional: accept None (parameters with None default)
+    :return: coercer or None if the annotation has nothing to check
+    """
+    coerce = _compile(annotation)
+    if coerce is not None and optional:
+        coerce = _optional(coerce)
+    return coerce
+
+
+def _compile(annotation):
+    if annotation is None or annotation is typing.Any or isinstance(annotation, str):
+        return None
+    origin = getattr(annotation, '__origin__', None)
+    args = getattr(annotation, '__args__', None) or ()
+    if origin is typing.Union or (_union_type is not None and isinstance(annotation, _union_type)):
+        if len(args) == 2 and type(None) in args:
+            inner = _compile(args[0] if args[1] is type(None) else args[1])
+            return _optional(inner) if inner is not None else None
+        return None
+    if origin in (list, typing.List):
+        return _list(_compile(args[0]) if args else None)
+    if origin in (dict, typing.Dict):
+        return _dict
+    if annotation is bool:
+        return _bool
+    if annotation is int:
+        return _int
+    if annotation is float:
+        return _float
+    if annotation is str:
+        return _str
+    if annotation is list:
+        return _list(None)
+    if annotation is dict:
+        return _dict
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        return _enum(annotation)
+    if dataclasses is not None and isinstance(annotation, type) and dataclasses.is_dataclass(annotation):
+        return _dataclass(annotation)
+    return None
+
+
+def _optional(coerce):
+    def optional(value):
+        if value is None:
+            return None
+        return coerce(value)
+    return optional
+
+
+def _int(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return int(value)
+    raise TypeError('expected int')
+
+
+def _float(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        return float(value)
+    raise TypeError('expected float')
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        lowered = value.lower()
+        if lowered in _true:
+            return True
+        if lowered in _false:
+            return False
+    raise ValueError('expected bool')
+
+
+def _str(value):
+    if type(value) is str:
+        return value
+    if isinstance(value, str):
+        return str(value)
+    raise TypeError('expected str')
+
+
+def _dict(value):
+    if isinstance(value, dict):
+        return value
+    raise TypeError('expected object')
+
+
+def _list(item):
+    def coerce_list(value):
+        if isinstance(value, QueryValue):
+            value = value.split(',') if value else []
+        elif not isinstance(value, list):
+            raise TypeError('expected list')
+        if item is None:
+            return value
+        return [item(v) for v in value]
+    return coerce_list
+
+
+def _enum(enum_cls):
+    by_value = {member.value: member for member in enum_cls}
+    # query strings give values of other types as str
+    by_str = {str(member.value): member for member in enum_cls}
+
+    def coerce_enum(value):
+        try:
+            return by_value[value]
+        except (KeyError, TypeError):
+            pass
+        if isinstance(value, str):
+            if value in by_str:
+                return by_str[value]
+            if value in enum_cls.__members__:
+                return enum_cls.__members__[value]
+        raise ValueError('expected one of %s' % ", ".join(by_str))
+    return coerce_enum
+
+
+def _dataclass(cls):
+    hints = typing.get_type_hints(cls)
+    fields = []
+    for field in dataclasses.fields(cls):
+        if not field.init:
+            continue
+        required = field.default is dataclasses.MISSING and field.default_factory is dataclasses.MISSING
+        fields.append((field.name, required, compile_coercer(hints.get(field.name), field.default is None)))
+    names = {name for name, _, _ in fields}
+
+    def coerce_dataclass(value):
+        if isinstance(value, cls):
+            return value
+        if not isinstance(value, dict):
+            raise TypeError('expected object')
+        unknown = [name for name in value if name not in names]
+        if unknown:
+            raise ValueError('unexpected field(s): %s' % ", ".join(unknown))
+        kwargs = {}
+        for name, required, coerce in fields:
+            if name in value:
+                try:
+                    kwargs[name] = coerce(value[name]) if coerce is not None else value[name]
+                except (ValueError, TypeError) as e:
+                    raise ValueError('field "%s": %s' % (name, e))
+            elif required:
+                raise ValueError('field "%s" not given' % name)
+        return cls(**kwargs)
+    return coerce_dataclass
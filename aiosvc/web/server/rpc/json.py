@@ -1,8 +1,8 @@
-import json
 import asyncio
 
 from aiohttp import web
 
+from aiosvc.web.server import compression
 from .base import RpcHandler, RpcError
 
 
@@ -13,6 +13,8 @@ _err_mapping = {
     RpcError.RPC_ERR_METHOD_NOT_FOUND: (-32601, "Method not found"),
     RpcError.RPC_ERR_INVALID_PARAMS_FORMAT: (-32602, "Invalid params"),
     RpcError.RPC_ERR_INVALID_PARAMS: (-32602, "Invalid params"),
+    RpcError.RPC_ERR_TIMEOUT: (-32001, "Request timeout"),
+    RpcError.RPC_ERR_OVERLOADED: (-32002, "Server overloaded"),
 }
 
 
@@ -20,36 +22,70 @@ class JsonRpcHandler(RpcHandler):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # format output(argument will be passed to json.dump function)
-        self._json_indent = ' ' * 4
         # process a batch web call as a set of concurrent tasks
         self._concurrent_batch_call = True
-
-    async def _respnse(self, body):
-        response = web.json_response(body)
-        return response
+        # max number of calls in a batch, None - unlimited
+        self._max_batch_size = None
+        # max number of concurrently executed calls of one batch, None - unlimited
+        self._batch_concurrency = None
+        # max number of concurrently executed calls of the handler, None - unlimited
+        self._concurrency = None
+        # timeout of a single call in seconds, None - unlimited
+        self._call_timeout = None
+        # write batch responses incrementally with chunked encoding
+        self._stream_batch = False
+        # order of streamed batch results: "request" or "completion"
+        self._stream_batch_order = "request"
+        self._semaphore = None
+
+    async def _setup(self, loop, app, server, http_app):
+        if self._concurrency:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        await super()._setup(loop, app, server, http_app)
 
     async def _handle_request(self, request):
-        body = await request.read()
+        codec = self._request_codec(request)
+        response_codec = self._response_codec(request, codec)
 
         try:
-            data = json.loads(body.decode())
-        except json.decoder.JSONDecodeError as e:
-            return await self._respnse(self._format_error(RpcError.RPC_ERR_PARSE))
-
-        is_batch = True
-        if not isinstance(data, list):
+            data = codec.loads(await self._read_body(request))
+        except RpcError as e:
+            return await self._respnse(self._format_error(e), response_codec, request)
+        except codec.decode_errors:
+            return await self._respnse(self._format_error(RpcError(RpcError.RPC_ERR_PARSE)), response_codec, request)
+
+        is_batch = isinstance(data, list)
+        if not is_batch:
             data = [data]
-            is_batch = False
 
+        error = self._check_batch(data)
+        if error is not None:
+            return await self._respnse(error, response_codec, request)
+        if is_batch and self._stream_batch:
+            return await self._stream_batch_response(data, request, response_codec)
+        results = await self._exec_batch(data, request)
+        return await self._respnse(results if is_batch else results[0], response_codec, request)
+
+    def _check_batch(self, data):
+        """
+        :return: error response if the batch is invalid
+        :rtype: dict | None
+        """
+        if self._max_batch_size is not None and len(data) > self._max_batch_size:
+            return self._format_error(RpcError(RpcError.RPC_ERR_INVALID_REQUEST,
+                                               details="batch size exceeds %s" % self._max_batch_size))
         for req in data:
             if not isinstance(req, dict):
-                return await self._respnse(self._format_error(RpcError.RPC_ERR_INVALID_REQUEST))
+                return self._format_error(RpcError(RpcError.RPC_ERR_INVALID_REQUEST))
+        return None
+
+    async def _exec_batch(self, data, request):
         results = []
         if self._concurrent_batch_call:
+            batch_semaphore = self._batch_semaphore(data)
             reqs = []
             for req in data:
-                reqs.append(self._exec_req(req, request))
+                reqs.append(self._exec_req(req, request, batch_semaphore))
             req_results = await asyncio.gather(*reqs)
             for result in req_results:
                 results.append(result)
@@ -57,25 +93,108 @@ class JsonRpcHandler(RpcHandler):
             for req in data:
                 result = await self._exec_req(req, request)
                 results.append(result)
+        return results
+
+    async def _overloaded_response(self, request, admission):
+        response = await self._respnse(self._format_error(RpcError(RpcError.RPC_ERR_OVERLOADED)),
+                                       self._response_codec(request, self._request_codec(request)), request)
+        response.set_status(503)
+        response.headers['Retry-After'] = str(admission.retry_after)
+        return response
+
+    def _batch_semaphore(self, data):
+        if self._batch_concurrency and len(data) > self._batch_concurrency:
+            return asyncio.Semaphore(self._batch_concurrency)
+        return None
+
+    async def _stream_batch_response(self, data, request, codec):
+        """
+        Writes every result as soon as it is ready (in request or completion order), the response is still a valid
+        array of the response codec
+        """
+        response = web.StreamResponse()
+        response.content_type = codec.content_type
+        if codec.charset:
+            response.charset = codec.charset
+        response.enable_chunked_encoding()
+        if self._compress_min_size is not None:
+            response.headers['Vary'] = 'Accept-Encoding'
+            # the size is unknown, a batch is large enough; chunks are compressed by aiohttp
+            encoding = compression.accepted_encoding(request.headers.get('Accept-Encoding'))
+            if encoding is not None:
+                response.enable_compression(web.ContentCoding(encoding))
+        await response.prepare(request)
+
+        tasks = []
+        if self._concurrent_batch_call:
+            batch_semaphore = self._batch_semaphore(data)
+            tasks = [asyncio.ensure_future(self._exec_req(req, request, batch_semaphore)) for req in data]
+            if self._stream_batch_order == "completion":
+                results = asyncio.as_completed(tasks)
+            else:
+                results = tasks
+        else:
+            results = (self._exec_req(req, request) for req in data)
+        try:
+            await response.write(codec.array_start(len(data)))
+            separator = b''
+            for result in results:
+                # the array is partly written, an element which can not be encoded is replaced by its error
+                await response.write(separator + self._dumps_result(await result, codec, request))
+                separator = codec.array_separator
+            if codec.array_end:
+                await response.write(codec.array_end)
+        finally:
+            for task in tasks:
+                task.cancel()
+        await response.write_eof()
+        return response
 
-        return await self._respnse(results if is_batch else results[0])
+    def _dumps_result(self, result, codec, request):
+        """
+        Encodes one call result, a result which can not be encoded is replaced by the error of its call
 
-    def _dumps(self, data):
-        return json.dumps(data, indent=self._json_indent)
+        :rtype: bytes
+        """
+        try:
+            return self._dumps(result, codec)
+        except Exception as e:
+            self._log_error(request, e)
+            return self._dumps(self._format_error(e, result.get("id")), codec)
 
-    async def _exec_req(self, req_data, request):
+    async def _exec_req(self, req_data, request, batch_semaphore=None):
         request_id = None
         try:
             request_id, method_name, method_params = self._parse_call(req_data)
-            result = await self._call_method(self, method_name, method_params, request, self._error_on_non_exist_params)
+            if batch_semaphore is not None:
+                async with batch_semaphore:
+                    result = await self._exec_call(method_name, method_params, request)
+            else:
+                result = await self._exec_call(method_name, method_params, request)
             return {
                 "jsonrpc": "2.0",
                 "id": request_id,
                 "result": result
             }
         except Exception as e:
+            self._log_error(request, e)
             return self._format_error(e, request_id)
 
+    async def _exec_call(self, method_name, method_params, request):
+        if self._semaphore is not None:
+            async with self._semaphore:
+                return await self._timed_call(method_name, method_params, request)
+        return await self._timed_call(method_name, method_params, request)
+
+    async def _timed_call(self, method_name, method_params, request):
+        call = self._call_method(self, method_name, method_params, request, self._error_on_non_exist_params)
+        if self._call_timeout is None:
+            return await call
+        try:
+            return await asyncio.wait_for(call, self._call_timeout)
+        except asyncio.TimeoutError:
+            raise RpcError(RpcError.RPC_ERR_TIMEOUT, details='method "%s" timed out' % method_name)
+
     @staticmethod
     def _format_error(e, request_id=None):
         if not isinstance(e, RpcError):
@@ -104,4 +223,4 @@ class JsonRpcHandler(RpcHandler):
         return request_id, req_data["method"], params
 
     async def _add_routes(self):
-        self._http_app.router.add_route("POST", self._route, self._handle_request)
+        self._http_app.router.add_route("POST", self._route, self._dispatch_request)
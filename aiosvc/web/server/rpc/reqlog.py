@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from collections import deque
+
+
+logger = logging.getLogger("aiosvc")
+
+
+class RequestLog(object):
+    """
+    Bounded in-memory queue of request log records, flushed in batches by a background task.
+    Records are put without blocking, when the queue is full they are dropped and counted.
+    """
+
+    def __init__(self, write, queue_size: int = 10000, batch_size: int = 100, flush_interval: float = 1.0):
+        """
+        :param write: coroutine function receiving a list of records
+        :param queue_size: max number of records waiting for flush
+        :param batch_size: max number of records passed to write at once
+        :param flush_interval: max time in seconds a record waits for flush
+        """
+        self._write = write
+        self._queue_size = queue_size
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue = deque()
+        self._wakeup = None
+        self._task = None
+        self.dropped = 0
+
+    def put(self, record):
+        if len(self._queue) >= self._queue_size:
+            self.dropped += 1
+            return
+        self._queue.append(record)
+        if len(self._queue) >= self._batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._flush()
+
+    async def _flush(self):
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(min(self._batch_size, len(self._queue)))]
+            try:
+                await self._write(batch)
+            except Exception as e:
+                logger.exception("Request log write failed: %s" % e)
@@ -1,35 +1,67 @@
-import json
-import urllib.parse
+import re
 
-from aiohttp import web
+from .base import RpcHandler, RpcError
+from .coerce import QueryValue
 
-from .base import RpcHandler
+
+_http_methods = {'POST', 'PUT', 'DELETE', 'TRACE', 'CONNECT', 'GET', 'HEAD', 'PATCH', 'OPTIONS'}
+
+# path parameter type -> (aiohttp pattern, converter)
+_converters = {
+    'str': (None, str),
+    'int': (r'-?\d+', int),
+    'float': (r'-?\d+(?:\.\d+)?', float),
+    'path': (r'.+', str),
+}
+
+_param_re = re.compile(r'{(\w+)(?::(\w+))?}')
+
+
+def route(path, method=None):
+    """
+    Sets the path of a rest method relative to the handler route, path parameters are passed to the method
+
+    Examples:
+        class Handler(RestRpcHandler):
+
+            @route('items/{id:int}')
+            async def get_item(self, id):
+                ...
+
+    :param path: path with parameters "{name}" or "{name:type}", type is one of str, int, float, path
+    :param method: http method, the method name prefix by default
+    """
+    def decorator(func):
+        func._rest_route = (path, method)
+        return func
+    return decorator
 
 
 class RestRpcHandler(RpcHandler):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # format output(argument will be passed to json.dump function)
-        self._json_indent = ' ' * 4
+        # aiohttp route -> (method plan, path parameter converters), compiled by _add_routes
+        self._routes = {}
 
     async def _handle_request(self, request):
-        log_data = {}
         try:
-            method_name = request.method.lower() + '_' + request.path[len(self._route):].lstrip('/').replace('/', '_')
-            print('method_name', method_name)
-            query_args = urllib.parse.parse_qs(request.query_string)
-            print('query_args', query_args)
-            method_params = {key: query_args[key].pop(0) for key in query_args}
-            print('method_params', method_params)
+            plan, converters = self._routes[request.match_info.route]
+            method_params = {}
+            for key, value in request.query.items():
+                method_params.setdefault(key, QueryValue(value))
+            for name, convert in converters:
+                try:
+                    method_params[name] = convert(request.match_info[name])
+                except ValueError:
+                    raise RpcError(RpcError.RPC_ERR_INVALID_PARAMS, details='invalid path parameter "%s"' % name)
 
-            result = await self._call_method(self, method_name, method_params, request, self._error_on_non_exist_params)
+            result = await self._call_measured(plan, method_params, request, self._error_on_non_exist_params)
 
-            return await self._respnse(result)
+            return await self._respnse(result, request=request)
         except Exception as e:
-            import traceback
-            print(traceback.format_exc())
-            return await self._respnse(self._format_error(e))
+            self._log_error(request, e)
+            return await self._respnse(self._format_error(e), request=request)
 
     @staticmethod
     def _format_error(e):
@@ -41,18 +73,35 @@ class RestRpcHandler(RpcHandler):
             },
         }
 
-    async def _respnse(self, body):
-        response = web.json_response(body)
-        return response
+    async def _add_routes(self):
+        for name, plan in self._dispatch.items():
+            http_method, path = None, None
+            if '_' in name:
+                http_method, path = name.split('_', 1)
+                path = path.replace('_', '/')
+            if hasattr(plan.method, '_rest_route'):
+                path, http_method = plan.method._rest_route[0], plan.method._rest_route[1] or http_method
+            if path is None or http_method is None or http_method.upper() not in _http_methods:
+                continue
+            pattern, converters = self._compile_path(path)
+            aiohttp_route = self._http_app.router.add_route(http_method.upper(), self._route + pattern,
+                                                            self._dispatch_request)
+            self._routes[aiohttp_route] = (plan, converters)
 
-    def _dumps(self, data):
-        return json.dumps(data, indent=self._json_indent)
+    @staticmethod
+    def _compile_path(path):
+        """
+        :return: aiohttp path pattern and (name, converter) of every path parameter
+        :rtype: tuple
+        """
+        converters = []
 
-    async def _add_routes(self):
-        methods = [d.split('_', 1) for d in self.__dir__() if d[0:1] != '_' and '_' in d]
-        print(methods)
-        for http_method, rpc_method in methods:
-            if http_method.upper() in {'POST', 'PUT', 'DELETE', 'TRACE', 'CONNECT', 'GET', 'HEAD', 'PATCH', 'OPTIONS'}:
-                print(http_method.upper(), self._route + rpc_method.replace('_', '/'))
-                self._http_app.router.add_route(http_method.upper(), self._route + rpc_method.replace('_', '/'), self._handle_request)
+        def replace(match):
+            name, type_name = match.group(1), match.group(2) or 'str'
+            if type_name not in _converters:
+                raise UserWarning('Unknown type "%s" of path parameter "%s"' % (type_name, name))
+            regex, convert = _converters[type_name]
+            converters.append((name, convert))
+            return '{%s:%s}' % (name, regex) if regex else '{%s}' % name
 
+        return _param_re.sub(replace, path.lstrip('/')), tuple(converters)
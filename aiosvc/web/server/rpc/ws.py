@@ -0,0 +1,146 @@
+import asyncio
+import logging
+
+from aiohttp import web, WSMsgType, WSCloseCode
+
+from aiosvc.web.codec import msgpack_codec
+from .json import JsonRpcHandler
+from .base import RpcError
+
+
+logger = logging.getLogger("aiosvc")
+
+
+class WsConnection(object):
+    """
+    A client connection of WsJsonRpcHandler, available to rpc hooks as request["rpc_connection"]
+    """
+
+    __slots__ = ('ws', 'request', 'semaphore', 'tasks', 'codec', 'binary')
+
+    def __init__(self, ws, request, codec, concurrency):
+        self.ws = ws
+        self.request = request
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.tasks = set()
+        # codec and frame type of the last message, used for server notifications
+        self.codec = codec
+        self.binary = False
+
+    async def send(self, data, codec=None, binary=None):
+        codec = codec or self.codec
+        await self.send_body(codec.dumps(data), binary)
+
+    async def send_body(self, body, binary=None):
+        """
+        :param body: message encoded with the codec of the frame type
+        :type body: bytes
+        """
+        if self.binary if binary is None else binary:
+            await self.ws.send_bytes(body)
+        else:
+            await self.ws.send_str(body.decode())
+
+
+class WsJsonRpcHandler(JsonRpcHandler):
+    """
+    JSON-RPC over a persistent WebSocket. Calls of one connection run concurrently and their responses are matched
+    by id, requests without id are notifications and get no response. Text frames are JSON, binary frames are
+    msgpack (if installed). The server pushes notifications with _notify() and _broadcast().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # max number of concurrently executed messages of a connection, reading pauses while it is reached
+        self._connection_concurrency = 64
+        # max size of an incoming message in bytes
+        self._max_msg_size = 4 * 1024 * 1024
+        # ping interval in seconds, None - disabled
+        self._heartbeat = 30.0
+        self._connections = set()
+
+    async def _add_routes(self):
+        # admission slots are not held for the lifetime of a connection, calls are limited by _concurrency and
+        # _connection_concurrency instead
+        self._http_app.router.add_route("GET", self._route, self._handle_request)
+
+    async def _before_stop(self):
+        await asyncio.gather(*[connection.ws.close(code=WSCloseCode.GOING_AWAY)
+                               for connection in list(self._connections)])
+
+    async def _handle_request(self, request):
+        ws = web.WebSocketResponse(heartbeat=self._heartbeat, max_msg_size=self._max_msg_size)
+        await ws.prepare(request)
+
+        connection = WsConnection(ws, request, self._codec, self._connection_concurrency)
+        request["rpc_connection"] = connection
+        self._connections.add(connection)
+        binary_codec = msgpack_codec() or self._codec
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.TEXT:
+                    codec, binary = self._codec, False
+                elif msg.type == WSMsgType.BINARY:
+                    codec, binary = binary_codec, True
+                else:
+                    continue
+                connection.codec, connection.binary = codec, binary
+                # backpressure: stop reading the socket until a slot is free
+                await connection.semaphore.acquire()
+                task = asyncio.ensure_future(self._handle_message(connection, msg.data, codec, binary))
+                connection.tasks.add(task)
+                task.add_done_callback(lambda task: self._message_done(connection, task))
+        finally:
+            self._connections.discard(connection)
+            for task in list(connection.tasks):
+                task.cancel()
+        return ws
+
+    @staticmethod
+    def _message_done(connection, task):
+        connection.tasks.discard(task)
+        connection.semaphore.release()
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("WebSocket rpc message failed: %s" % task.exception())
+
+    async def _handle_message(self, connection, body, codec, binary):
+        try:
+            data = codec.loads(body)
+        except codec.decode_errors:
+            await connection.send(self._format_error(RpcError(RpcError.RPC_ERR_PARSE)), codec, binary)
+            return
+
+        is_batch = isinstance(data, list)
+        if not is_batch:
+            data = [data]
+        error = self._check_batch(data)
+        if error is not None:
+            await connection.send(error, codec, binary)
+            return
+
+        results = await self._exec_batch(data, connection.request)
+        results = [result for req, result in zip(data, results) if "id" in req]
+        if not results or connection.ws.closed:
+            return
+        # every element is encoded on its own, so one unencodable result does not lose the replies of the others
+        chunks = [self._dumps_result(result, codec, connection.request) for result in results]
+        if is_batch:
+            body = codec.array_start(len(chunks)) + codec.array_separator.join(chunks) + codec.array_end
+        else:
+            body = chunks[0]
+        await connection.send_body(body, binary)
+
+    async def _notify(self, connection, method, params=None):
+        """
+        Sends a notification to a client
+
+        :type connection: WsConnection
+        """
+        await connection.send({"jsonrpc": "2.0", "method": method, "params": params})
+
+    async def _broadcast(self, method, params=None):
+        """
+        Sends a notification to every connected client
+        """
+        await asyncio.gather(*[self._notify(connection, method, params) for connection in list(self._connections)
+                               if not connection.ws.closed], return_exceptions=True)
@@ -1,7 +1,9 @@
+import socket
 import logging
 import asyncio
 import aiohttp.web
 from aiosvc import Componet
+from .admission import Admission, LoopLagMonitor
 
 
 logger = logging.getLogger("aiosvc")
@@ -9,32 +11,119 @@ logger = logging.getLogger("aiosvc")
 
 class Server(Componet):
 
-    def __init__(self, handlers, host='localhost', port=8888, stop_timeout=60.0, start_priority=5,
-                 loop: asyncio.AbstractEventLoop = None):
+    def __init__(self, handlers, host='localhost', port=8888, stop_timeout=60.0, start_priority=5, reuse_port=False,
+                 backlog=100, max_concurrency=None, max_queue=0, queue_timeout=None, max_loop_lag=None,
+                 max_pool_wait=None, pool='db', retry_after=1, loop: asyncio.AbstractEventLoop = None):
+        """
+        :param reuse_port: in worker mode every worker binds its own socket with SO_REUSEPORT, otherwise the
+            listening socket is bound by the master process and inherited by the workers
+        :param max_concurrency: max number of requests handled concurrently by all handlers, None - unlimited
+        :param max_queue: max number of requests waiting for a free slot, others get 503
+        :param queue_timeout: max time in seconds a request waits for a free slot
+        :param max_loop_lag: shed requests while the event loop lags more than this number of seconds
+        :param max_pool_wait: shed requests while the average wait for a connection of the pool component exceeds
+            this number of seconds
+        :param pool: name of the aiosvc.db.PgPool component checked by max_pool_wait
+        """
         super().__init__(loop=loop, start_priority=start_priority)
         self._stop_timeout = stop_timeout
         self._host = host
         self._port = port
+        self._reuse_port = reuse_port
+        self._backlog = backlog
+        # listening sockets bound by the master process, one per resolved address
+        self._socks = []
         self._initialized = False
         self._before_stopping = False
         self._stopping = False
         self._handler = None
-        self._server = None
+        self._servers = []
         self._handlers = handlers
+        self._max_loop_lag = max_loop_lag
+        self._max_pool_wait = max_pool_wait
+        self._pool_name = pool
+        self._lag_monitor = None
+        self._admission = None
+        if max_concurrency is not None or max_loop_lag is not None or max_pool_wait is not None:
+            self._admission = Admission(max_concurrency, max_queue, queue_timeout, retry_after=retry_after)
         self._http_app = aiohttp.web.Application(logger=logger, loop=self._loop)
 
+    @property
+    def admission(self):
+        """
+        :rtype: aiosvc.web.server.admission.Admission | None
+        """
+        return self._admission
+
+    async def _setup(self, app):
+        await super()._setup(app)
+        if self._admission is not None:
+            self._admission.register_metrics(app.metrics, self._name)
+
     async def _start(self):
+        if self._max_loop_lag is not None and self._lag_monitor is None:
+            self._lag_monitor = LoopLagMonitor(self._loop)
+            self._admission.add_check(lambda: self._lag_monitor.lag > self._max_loop_lag)
+        if self._lag_monitor is not None:
+            self._lag_monitor.start()
+        if self._max_pool_wait is not None:
+            pool = getattr(self._app, self._pool_name)
+            self._admission.add_check(lambda: pool.acquire_wait > self._max_pool_wait)
+
         self._handler = self._http_app.make_handler()
-        self._server = await self._loop.create_server(self._handler, self._host, self._port)
+        if self._socks:
+            self._servers = [await self._loop.create_server(self._handler, sock=sock, backlog=self._backlog)
+                             for sock in self._socks]
+        else:
+            self._servers = [await self._loop.create_server(self._handler, self._host, self._port,
+                                                            reuse_port=self._reuse_port or None,
+                                                            backlog=self._backlog)]
 
         for handler in self._handlers:
             await handler._setup(self._loop, self._app, self, self._http_app)
 
+    def _before_fork(self):
+        if self._reuse_port:
+            return
+        # every resolved address is bound, as loop.create_server does (e.g. both 127.0.0.1 and ::1 of localhost)
+        infos = dict.fromkeys(socket.getaddrinfo(self._host, self._port, type=socket.SOCK_STREAM,
+                                                 flags=socket.AI_PASSIVE))
+        socks = []
+        try:
+            for family, type_, proto, _, address in infos:
+                sock = socket.socket(family, type_, proto)
+                socks.append(sock)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                if family == socket.AF_INET6 and hasattr(socket, 'IPPROTO_IPV6'):
+                    # the IPv4 address is bound by its own socket
+                    sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, True)
+                sock.bind(address)
+                sock.listen(self._backlog)
+                sock.setblocking(False)
+        except Exception:
+            for sock in socks:
+                sock.close()
+            raise
+        self._socks = socks
+
+    def _after_fork(self, loop):
+        super()._after_fork(loop)
+        self._http_app = aiohttp.web.Application(logger=logger, loop=self._loop)
+        self._lag_monitor = None
+
     async def _before_stop(self):
-        self._server.close()
-        await self._server.wait_closed()
+        for server in self._servers:
+            server.close()
+        for server in self._servers:
+            await server.wait_closed()
+        for handler in self._handlers:
+            await handler._before_stop()
 
     async def _stop(self):
+        if self._lag_monitor is not None:
+            await self._lag_monitor.stop()
         await self._http_app.shutdown()
         await self._handler.finish_connections(self._stop_timeout)
         await self._http_app.cleanup()
+        for handler in self._handlers:
+            await handler._stop()
@@ -1,6 +1,7 @@
 import asyncio
 import aiosvc
 from aiohttp.web import Response
+from .admission import Admission
 
 
 class SimpleHandler:
@@ -9,24 +10,38 @@ class SimpleHandler:
     :type _loop: asyncio.AbstractEventLoop
     """
 
-    def __init__(self, route, methods=None):
+    def __init__(self, route, methods=None, max_concurrency=None, max_queue=0, queue_timeout=None):
+        """
+        :param max_concurrency: max number of requests handled concurrently, None - unlimited
+        :param max_queue: max number of requests waiting for a free slot, others get 503
+        :param queue_timeout: max time in seconds a request waits for a free slot
+        """
         self._route = route
         self._app = None
         self._loop = None
         self._server = None
         self._http_app = None
         self._methods = methods or ["GET"]
+        self._admission = None
+        if max_concurrency is not None:
+            self._admission = Admission(max_concurrency, max_queue, queue_timeout)
+        # server and handler admissions checked for every request
+        self._admissions = ()
 
     async def _setup(self, loop, app, server, http_app):
         self._loop = loop
         self._app = app
         self._server = server
         self._http_app = http_app
+        self._admissions = tuple(admission for admission in (server.admission, self._admission)
+                                 if admission is not None)
+        if self._admission is not None and app is not None:
+            self._admission.register_metrics(app.metrics, self._route)
         await self._add_routes()
 
     async def _add_routes(self):
         for method in self._methods:
-            self._http_app.router.add_route(method, self._route, self._handle_request)
+            self._http_app.router.add_route(method, self._route, self._dispatch_request)
 
     @property
     def app(self):
@@ -36,6 +51,36 @@ class SimpleHandler:
         """
         return self._app
 
+    async def _before_stop(self):
+        pass
+
+    async def _stop(self):
+        pass
+
+    @property
+    def admission(self):
+        """
+        :rtype: aiosvc.web.server.admission.Admission | None
+        """
+        return self._admission
+
+    async def _dispatch_request(self, request):
+        if not self._admissions:
+            return await self._handle_request(request)
+        acquired = []
+        try:
+            for admission in self._admissions:
+                if not await admission.acquire():
+                    return await self._overloaded_response(request, admission)
+                acquired.append(admission)
+            return await self._handle_request(request)
+        finally:
+            for admission in reversed(acquired):
+                admission.release()
+
+    async def _overloaded_response(self, request, admission):
+        return Response(status=503, text='Service Unavailable', headers={'Retry-After': str(admission.retry_after)})
+
     async def _handle_request(self, request):
         return await self.handle(request)
 
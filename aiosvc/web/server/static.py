@@ -0,0 +1,192 @@
+import os
+import stat
+import time
+import mimetypes
+from email.utils import formatdate
+
+from aiohttp import web
+
+from aiosvc.lru import LruCache
+
+from . import compression
+from .simple import SimpleHandler
+
+
+class _FileEntry(object):
+    """
+    Metadata of a file (size is None if it does not exist) and the content of a small one
+    """
+
+    __slots__ = ('path', 'size', 'mtime_ns', 'etag', 'last_modified', 'content_type', 'body', 'checked_at')
+
+    def __init__(self, path, st=None, checked_at=0):
+        self.path = path
+        self.size = None
+        self.mtime_ns = None
+        self.etag = None
+        self.last_modified = None
+        self.content_type = None
+        self.body = None
+        self.checked_at = checked_at
+        if st is not None:
+            self.size = st.st_size
+            self.mtime_ns = st.st_mtime_ns
+            # same format as aiohttp FileResponse
+            self.etag = '"%x-%x"' % (st.st_mtime_ns, st.st_size)
+            self.last_modified = formatdate(st.st_mtime, usegmt=True)
+            self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    def same(self, st):
+        return self.size == st.st_size and self.mtime_ns == st.st_mtime_ns
+
+
+class StaticHandler(SimpleHandler):
+    """
+    Serves files of a directory
+
+    Examples:
+        StaticHandler('/static/', '/srv/assets', max_age=3600)
+
+    Files up to cache_file_size are kept in memory, larger ones are sent with sendfile.
+    A precompressed "<name>.gz" sibling is served to clients accepting gzip.
+    """
+
+    def __init__(self, route, directory, methods=None, cache_size=1024, cache_file_size=64 * 1024,
+                 stat_ttl=1.0, max_age=None, **kwargs):
+        """
+        :param route: url prefix, e.g. '/static/'
+        :param directory: root directory of served files
+        :param cache_size: max number of files whose metadata (and content of small ones) is cached
+        :param cache_file_size: max size of a file kept in memory
+        :param stat_ttl: seconds a cached entry is used before the file is checked for changes again
+        :param max_age: value of Cache-Control max-age in seconds, None - header is not sent
+        """
+        super().__init__(route.rstrip('/') + '/{path:.*}', methods=methods or ['GET', 'HEAD'], **kwargs)
+        self._directory = os.path.realpath(directory)
+        self._cache_file_size = cache_file_size
+        self._stat_ttl = stat_ttl
+        self._cache_control = 'public, max-age=%d' % max_age if max_age is not None else None
+        # relative name -> _FileEntry, an entry older than stat_ttl is kept to revalidate it against the file
+        self._entries = LruCache(cache_size)
+        self.hits = 0
+        self.misses = 0
+
+    async def handle(self, request):
+        name = request.match_info.get('path', '')
+        entry = await self._lookup(name)
+        if entry is None:
+            return web.Response(status=404, text='Not Found')
+        gz = await self._lookup(name + '.gz')
+
+        headers = {}
+        if self._cache_control is not None:
+            headers['Cache-Control'] = self._cache_control
+        if gz is not None:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if entry.body is None:
+            # sendfile; aiohttp picks the .gz variant and handles conditional and range requests itself
+            return web.FileResponse(entry.path, headers=headers)
+
+        variant = entry
+        if gz is not None and gz.body is not None and \
+                compression.accepted_encoding(request.headers.get('Accept-Encoding')) == 'gzip':
+            variant = gz
+            headers['Content-Encoding'] = 'gzip'
+        headers['Content-Type'] = entry.content_type
+        headers['ETag'] = variant.etag
+        headers['Last-Modified'] = variant.last_modified
+        headers['Accept-Ranges'] = 'bytes'
+
+        if self._not_modified(request, variant):
+            del headers['Content-Type']
+            return web.Response(status=304, headers=headers)
+
+        body = variant.body
+        if 'Range' in request.headers and self._if_range(request, variant):
+            try:
+                rng = request.http_range
+            except ValueError:
+                # multiple or malformed ranges, the whole body is sent
+                rng = None
+            if rng is not None and (rng.start is not None or rng.stop is not None):
+                start, stop, _ = rng.indices(len(body))
+                if rng.start is not None and rng.start >= len(body) or start >= stop:
+                    return web.Response(status=416, headers={'Content-Range': 'bytes */%d' % len(body)})
+                headers['Content-Range'] = 'bytes %d-%d/%d' % (start, stop - 1, len(body))
+                return web.Response(status=206, body=body[start:stop], headers=headers)
+        return web.Response(body=body, headers=headers)
+
+    @staticmethod
+    def _not_modified(request, entry):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            if if_none_match.strip() == '*':
+                return True
+            for tag in if_none_match.split(','):
+                tag = tag.strip()
+                if tag[:2] == 'W/':
+                    tag = tag[2:]
+                if tag == entry.etag:
+                    return True
+            return False
+        if_modified_since = request.if_modified_since
+        if if_modified_since is not None:
+            return entry.mtime_ns // 1000000000 <= if_modified_since.timestamp()
+        return False
+
+    @staticmethod
+    def _if_range(request, entry):
+        if_range = request.headers.get('If-Range')
+        return if_range is None or if_range.strip() in (entry.etag, entry.last_modified)
+
+    async def _lookup(self, name):
+        """
+        :return: metadata of an existing regular file, cached for stat_ttl seconds
+        :rtype: _FileEntry | None
+        """
+        now = time.monotonic()
+        entry = self._entries.get(name)
+        if entry is not None and now - entry.checked_at < self._stat_ttl:
+            self.hits += 1
+            return entry if entry.size is not None else None
+
+        self.misses += 1
+        path = entry.path if entry is not None else self._resolve(name)
+        st = None
+        if path is not None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                pass
+            if st is not None and not stat.S_ISREG(st.st_mode):
+                st = None
+
+        if st is None:
+            entry = _FileEntry(path, checked_at=now)
+        elif entry is None or not entry.same(st):
+            entry = _FileEntry(path, st, now)
+            if st.st_size <= self._cache_file_size:
+                entry.body = await self._loop.run_in_executor(None, self._read, path)
+        else:
+            entry.checked_at = now
+
+        self._entries.set(name, entry)
+        return entry if entry.size is not None else None
+
+    def _resolve(self, name):
+        """
+        :return: absolute path inside the directory
+        :rtype: str | None
+        """
+        if '\x00' in name:
+            return None
+        path = os.path.realpath(os.path.join(self._directory, name))
+        if not path.startswith(self._directory + os.sep):
+            return None
+        return path
+
+    @staticmethod
+    def _read(path):
+        with open(path, 'rb') as f:
+            return f.read()
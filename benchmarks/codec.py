@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+"""
+Per-request cost of decoding a JSON-RPC batch body and encoding its response with every available codec.
+
+    python3 benchmarks/codec.py [batch_size] [repeat]
+"""
+
+import sys
+import json
+import timeit
+
+from aiosvc.web import codec
+
+
+def make_payload(batch_size):
+    request = [{"jsonrpc": "2.0", "id": i, "method": "get_items",
+                "params": {"ids": list(range(20)), "filter": {"name": "item %s" % i, "active": True}}}
+               for i in range(batch_size)]
+    response = [{"jsonrpc": "2.0", "id": i,
+                 "result": [{"id": n, "name": "Название %s" % n, "price": n * 1.5, "tags": ["a", "b"]}
+                            for n in range(20)]}
+                for i in range(batch_size)]
+    return json.dumps(request).encode(), response
+
+
+def legacy(body, response):
+    # what the handlers did before codecs: decode to str, stdlib json both ways
+    json.loads(body.decode())
+    json.dumps(response).encode()
+
+
+def main():
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    body, response = make_payload(batch_size)
+    print("batch size: %s, request body: %.1f KiB" % (batch_size, len(body) / 1024))
+
+    candidates = [("legacy stdlib", legacy)]
+    for name, cls, module in (("JsonCodec", codec.JsonCodec, json), ("UjsonCodec", codec.UjsonCodec, codec.ujson),
+                              ("OrjsonCodec", codec.OrjsonCodec, codec.orjson)):
+        if module is None:
+            print("%s: not installed" % name)
+            continue
+        c = cls()
+        candidates.append((name, lambda b, r, c=c: (c.loads(b), c.dumps(r))))
+
+    baseline = None
+    for name, func in candidates:
+        best = min(timeit.repeat(lambda: func(body, response), number=1, repeat=repeat))
+        baseline = baseline or best
+        print("%-14s %9.3f ms/request  x%.2f" % (name, best * 1000, baseline / best))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import os
 import configparser
 import asyncio
 import aiosvc.db.pg
+import aiosvc.db.writer
 import pytest
 import aioredis
 import aiosvc.db.redis
@@ -53,6 +54,157 @@ class TestPg:
             await db._before_stop()
             await db._stop()
 
+    @pytest.mark.asyncio
+    async def test_statements(self, event_loop):
+        dsn = config.get("pg", "dsn")
+
+        db = aiosvc.db.pg.Pool(dsn, min_size=1, max_size=1, statements={'add': 'SELECT $1::int + $2::int'},
+                               loop=event_loop)
+        try:
+            await db._start()
+
+            assert await db.fetchval_named('add', 1, 2) == 3
+            assert db.statement_stats()["hits"] == 1
+            assert db.statement_stats()["misses"] == 0
+
+            db.add_statement('one', 'SELECT 1 AS one')
+            async with db.acquire() as conn:
+                row = await db.fetchrow_named('one', conn=conn)
+                assert row["one"] == 1
+            assert await db.fetchval_named('one') == 1
+            assert db.statement_stats()["misses"] == 1
+
+            with pytest.raises(UserWarning):
+                await db.fetch_named('unknown')
+        finally:
+            await db._before_stop()
+            await db._stop()
+
+    @pytest.mark.asyncio
+    async def test_statements_recycle(self, event_loop):
+        dsn = config.get("pg", "dsn")
+
+        db = aiosvc.db.pg.Pool(dsn, min_size=1, max_size=2, max_queries=1, statements={'one': 'SELECT 1'},
+                               loop=event_loop)
+        try:
+            await db._start()
+
+            for _ in range(20):
+                assert await db.fetchval_named('one') == 1
+            # termination listeners run on the next loop iteration
+            await asyncio.sleep(0.1)
+            assert db.statement_stats()["connections"] <= 2
+        finally:
+            await db._before_stop()
+            await db._stop()
+        await asyncio.sleep(0.1)
+        assert db.statement_stats()["connections"] == 0
+
+    @pytest.mark.asyncio
+    async def test_replicas(self, event_loop):
+        dsn = config.get("pg", "dsn")
+
+        db = aiosvc.db.pg.Pool(dsn, min_size=1, max_size=1, replicas=[dsn], loop=event_loop)
+        try:
+            await db._start()
+
+            async with db.acquire(readonly=True) as conn:
+                assert db._replicas[0].outstanding == 1
+                assert await conn.fetchval("SELECT 1") == 1
+            assert db._replicas[0].outstanding == 0
+
+            async with db.transaction(readonly=True) as conn:
+                assert await conn.fetchval("SHOW transaction_read_only") == 'on'
+        finally:
+            await db._before_stop()
+            await db._stop()
+
+    @pytest.mark.asyncio
+    async def test_replica_fallback(self, event_loop):
+        dsn = config.get("pg", "dsn")
+
+        db = aiosvc.db.pg.Pool(dsn, min_size=1, max_size=1, replicas=['postgres://127.0.0.1:1/none'],
+                               loop=event_loop)
+        try:
+            await db._start()
+            assert not db._replicas[0].healthy
+
+            async with db.acquire(readonly=True) as conn:
+                assert await conn.fetchval("SELECT 1") == 1
+        finally:
+            await db._before_stop()
+            await db._stop()
+
+    @pytest.mark.asyncio
+    async def test_copy_writer(self, event_loop):
+        dsn = config.get("pg", "dsn")
+
+        db = aiosvc.db.pg.Pool(dsn, min_size=1, max_size=2, loop=event_loop)
+        writer = aiosvc.db.writer.CopyWriter({'aiosvc_copy_test': ('id', 'name')}, pool=db, max_rows=10,
+                                             loop=event_loop)
+        try:
+            await db._start()
+            async with db.acquire() as conn:
+                await conn.execute("CREATE TABLE aiosvc_copy_test (id int, name text)")
+            await writer._start()
+
+            results = await asyncio.gather(*[writer.write('aiosvc_copy_test', (i, str(i))) for i in range(25)])
+            assert results.count(10) == 20
+            future = await writer.put('aiosvc_copy_test', (25, '25'))
+            await writer._before_stop()
+            assert future.result() == 1
+
+            async with db.acquire() as conn:
+                assert await conn.fetchval("SELECT count(*) FROM aiosvc_copy_test") == 26
+        finally:
+            async with db.acquire() as conn:
+                await conn.execute("DROP TABLE IF EXISTS aiosvc_copy_test")
+            await db._before_stop()
+            await db._stop()
+
+    @pytest.mark.asyncio
+    async def test_loader(self, event_loop):
+        dsn = config.get("pg", "dsn")
+
+        db = aiosvc.db.pg.Pool(dsn, min_size=1, max_size=1, loop=event_loop)
+        try:
+            await db._start()
+
+            loader = db.loader("SELECT id, id * 2 AS double FROM unnest($1::int[]) AS id WHERE id < 10")
+            rows = await asyncio.gather(loader.load(1), loader.load(2), loader.load(1), loader.load(20))
+            assert [row["double"] for row in rows[:3]] == [2, 4, 2]
+            assert rows[3] is None
+            assert loader.queries == 1
+
+            assert (await loader.load(2))["double"] == 4
+            assert loader.queries == 1
+
+            many = db.loader("SELECT id % 2 AS parity, id FROM generate_series(1, 4) AS id WHERE id % 2 = ANY($1)",
+                             key='parity', many=True)
+            assert [row["id"] for row in await many.load(1)] == [1, 3]
+        finally:
+            await db._before_stop()
+            await db._stop()
+
+    @pytest.mark.asyncio
+    async def test_query_cache(self, event_loop):
+        dsn = config.get("pg", "dsn")
+
+        db = aiosvc.db.pg.Pool(dsn, min_size=1, max_size=1, cache_size=10, loop=event_loop)
+        try:
+            await db._start()
+
+            first = await db.fetch_cached("SELECT random() AS r", tags=('aiosvc_test', ))
+            assert await db.fetch_cached("SELECT random() AS r", tags=('aiosvc_test', )) is first
+
+            await db.notify('aiosvc_test')
+            await asyncio.sleep(0.5)
+            assert await db.fetch_cached("SELECT random() AS r", tags=('aiosvc_test', )) is not first
+            assert db.cache_stats()["invalidations"] == 1
+        finally:
+            await db._before_stop()
+            await db._stop()
+
 
 class TestRedis:
 
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("asyncpg")
+
+from aiosvc.db.pg import Pool  # noqa: E402
+from aiosvc.web.server.admission import Admission  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_limit_and_queue():
+    async def main():
+        admission = Admission(limit=1, queue_size=1)
+        assert await admission.acquire()
+        queued = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        assert admission.queued == 1
+        # the queue is full
+        assert not await admission.acquire()
+        assert admission.shed == 1
+
+        admission.release()
+        assert await queued
+        assert admission.in_flight == 1
+        admission.release()
+        assert admission.stats() == {"in_flight": 0, "queued": 0, "shed": 1}
+    run(main())
+
+
+def test_queue_timeout():
+    async def main():
+        admission = Admission(limit=1, queue_size=1, queue_timeout=0.01)
+        assert await admission.acquire()
+        assert not await admission.acquire()
+        assert admission.shed == 1
+        assert admission.queued == 0
+        admission.release()
+        assert admission.in_flight == 0
+    run(main())
+
+
+def test_cancelled_waiter():
+    async def main():
+        admission = Admission(limit=1, queue_size=2)
+        assert await admission.acquire()
+        cancelled = asyncio.ensure_future(admission.acquire())
+        waiting = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        assert admission.queued == 1
+
+        # the slot goes to the remaining waiter
+        admission.release()
+        assert await waiting
+        admission.release()
+        assert admission.in_flight == 0
+    run(main())
+
+
+def test_checks():
+    async def main():
+        overloaded = [True]
+        admission = Admission(checks=[lambda: overloaded[0]])
+        assert not await admission.acquire()
+        overloaded[0] = False
+        assert await admission.acquire()
+    run(main())
+
+
+class _TimingOutPool:
+
+    async def acquire(self, timeout=None):
+        await asyncio.sleep(timeout)
+        raise asyncio.TimeoutError()
+
+
+def test_pool_wait_shedding_stops_when_idle():
+    async def main():
+        pool = Pool()
+        pool.acquire_wait_halflife = 0.01
+        admission = Admission(checks=[lambda: pool.acquire_wait > 0.05])
+        for _ in range(20):
+            pool._observe_acquire(1.0)
+        assert not await admission.acquire()
+
+        # nothing is acquired while requests are shed, the signal decays by itself
+        await asyncio.sleep(0.2)
+        assert pool.acquire_wait < 0.05
+        assert await admission.acquire()
+    run(main())
+
+
+def test_pool_wait_counts_timed_out_and_pending_acquires():
+    async def main():
+        pool = Pool()
+        pool._pool = _TimingOutPool()
+        pending = asyncio.ensure_future(pool._acquire(0.05))
+        await asyncio.sleep(0.03)
+        # the running acquire raises the signal before it finishes
+        assert pool.acquire_wait >= 0.03
+        with pytest.raises(asyncio.TimeoutError):
+            await pending
+        assert pool._acquire_wait > 0
+        assert not pool._pending_acquires
+    run(main())
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from aiosvc import Application, Componet
+
+
+class _Component(Componet):
+
+    def __init__(self, events, fail=False, hang=False, **kwargs):
+        super().__init__(**kwargs)
+        self._events = events
+        self._fail = fail
+        self._hang = hang
+
+    async def _start(self):
+        self._events.append(('start', self._name))
+        if self._hang:
+            await asyncio.sleep(10)
+        if self._fail:
+            raise RuntimeError('failed')
+        await asyncio.sleep(0.01)
+
+    async def _before_stop(self):
+        pass
+
+    async def _stop(self):
+        self._events.append(('stop', self._name))
+
+
+@pytest.fixture
+def app():
+    loop = asyncio.new_event_loop()
+    app = Application(loop=loop, start_timeout=1, stop_timeout=1)
+    yield app
+    if not loop.is_closed():
+        loop.close()
+
+
+def _order(events, phase):
+    return [name for event, name in events if event == phase]
+
+
+def test_start_graph(app):
+    events = []
+    app.attach('db', _Component(events, start_priority=1))
+    app.attach('cache', _Component(events, start_priority=1))
+    app.attach('api', _Component(events, start_priority=2))
+    app.attach('worker', _Component(events, start_priority=3), depends=['db'])
+    graph = app._start_graph()
+    assert graph == {'db': set(), 'cache': set(), 'api': {'db', 'cache'}, 'worker': {'db'}}
+    assert app._stop_graph(graph) == {'db': {'api', 'worker'}, 'cache': {'api'}, 'api': set(), 'worker': set()}
+
+
+def test_phase_order(app):
+    events = []
+    app.attach('db', _Component(events, start_priority=1))
+    app.attach('api', _Component(events, start_priority=2))
+    app.attach('worker', _Component(events, start_priority=3))
+    graph = app._start_graph()
+    results = app._loop.run_until_complete(app._run_phase('_start', graph, None, {}))
+    assert dict(results) == {'db': True, 'api': True, 'worker': True}
+    app._loop.run_until_complete(app._run_phase('_stop', app._stop_graph(graph), None, {}))
+    assert _order(events, 'start') == ['db', 'api', 'worker']
+    assert _order(events, 'stop') == ['worker', 'api', 'db']
+
+
+@pytest.mark.parametrize("depends", [
+    {'a': ['b'], 'b': ['a']},
+    {'a': ['b'], 'b': ['c'], 'c': ['a']},
+    {'a': ['a']},
+])
+def test_cycle(app, depends):
+    for name, deps in depends.items():
+        app.attach(name, _Component([]), depends=deps)
+    with pytest.raises(UserWarning, match='circular'):
+        app._start_graph()
+
+
+def test_missing_dependency(app):
+    app.attach('a', _Component([]), depends=['b'])
+    with pytest.raises(UserWarning, match='not attached'):
+        app._start_graph()
+
+
+def test_start_failure_rollback(app):
+    events = []
+    app.attach('db', _Component(events))
+    app.attach('broken', _Component(events, fail=True), depends=['db'])
+    app.attach('api', _Component(events), depends=['broken'])
+    app.attach('slow', _Component(events, hang=True), depends=['db'], start_timeout=0.05)
+    with pytest.raises(RuntimeError, match='broken, slow, api'):
+        app._run()
+    assert sorted(_order(events, 'start')) == ['broken', 'db', 'slow']
+    # the timed out component is stopped before its dependency, the failed one and its dependants are not
+    assert _order(events, 'stop') == ['slow', 'db']
+    assert app._start_report.keys() == {'db'}
@@ -0,0 +1,129 @@
+import json
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiosvc.web.client.breaker import CircuitBreaker, LatencyWindow  # noqa: E402
+from aiosvc.web.client.rpc import JsonRpcClient  # noqa: E402
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+@pytest.mark.parametrize("outcome, state", [
+    ('success', CircuitBreaker.CLOSED),
+    ('failure', CircuitBreaker.OPEN),
+])
+def test_breaker_probe(outcome, state):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.failure()
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # one probe at a time
+    assert not breaker.allow()
+    getattr(breaker, outcome)()
+    assert breaker.state == state
+
+
+def test_breaker_cancelled_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.failure()
+    assert breaker.allow()
+    breaker.cancel()
+    assert breaker.allow()
+
+
+def test_latency_window():
+    window = LatencyWindow(0.9, size=10, min_samples=5, refresh=5)
+    for latency in range(4):
+        window.observe(latency)
+    assert window.value is None
+    window.observe(4)
+    assert window.value == 4
+    # recomputed every refresh observations over the last size ones
+    for _ in range(4):
+        window.observe(100)
+    assert window.value == 4
+    window.observe(100)
+    assert window.value == 100
+    for _ in range(10):
+        window.observe(1)
+    assert window.value == 1
+
+
+class _Response(object):
+
+    def __init__(self, status, body, delay):
+        self.status = status
+        self._body = body
+        self._delay = delay
+
+    async def read(self):
+        await asyncio.sleep(self._delay)
+        return self._body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+class _Client(JsonRpcClient):
+    """
+    Endpoints answer with url -> (status, delay)
+    """
+
+    def __init__(self, answers, **kwargs):
+        super().__init__(list(answers), hedge_percentile=0.5, hedge_min_samples=1, **kwargs)
+        self.answers = answers
+        self.sent = []
+
+    def post(self, url, data=None, **kwargs):
+        self.sent.append(url)
+        status, delay = self.answers[url]
+        return _Response(status, json.dumps({"jsonrpc": "2.0", "id": 1, "result": url}).encode(), delay)
+
+
+def _post(client):
+    client._latency.value = 0.01
+    client._next_endpoint = 0
+    return asyncio.run(client._post([{"jsonrpc": "2.0", "id": 1, "method": "m"}], hedge=True))
+
+
+def test_hedge_wins():
+    client = _Client({'slow': (200, 1), 'fast': (200, 0)}, hedge_budget=1)
+    assert _post(client) == {"jsonrpc": "2.0", "id": 1, "result": 'fast'}
+    assert client.hedged == client.hedge_wins == 1
+    # the cancelled loser is observed with its latency so far
+    assert client._latency._samples[-1] >= 0.01
+
+
+def test_hedge_failed_response_loses():
+    client = _Client({'slow': (200, 0.05), 'broken': (500, 0)}, hedge_budget=1)
+    assert _post(client)["result"] == 'slow'
+    assert client.hedged == 1 and client.hedge_wins == 0
+
+
+def test_hedge_failed_responses():
+    client = _Client({'slow': (503, 0.05), 'broken': (500, 0)}, hedge_budget=1)
+    assert _post(client)["result"] == 'broken'
+
+
+def test_hedge_budget():
+    client = _Client({'slow': (200, 0.02), 'fast': (200, 0)}, hedge_budget=0.5)
+    assert _post(client)["result"] == 'slow'
+    assert _post(client)["result"] == 'fast'
+    assert _post(client)["result"] == 'slow'
+    assert client.hedged == 1
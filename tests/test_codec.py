@@ -0,0 +1,65 @@
+import json
+import datetime
+import dataclasses
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiosvc.web import codec  # noqa: E402
+
+
+_non_finite = [float('nan'), float('inf'), [float('-inf')]]
+
+
+@dataclasses.dataclass
+class _Point(object):
+    x: int
+
+
+def _codecs():
+    codecs = [codec.JsonCodec()]
+    if codec.orjson is not None:
+        codecs.append(codec.OrjsonCodec())
+    if codec.ujson is not None:
+        codecs.append(codec.UjsonCodec())
+    return codecs
+
+
+@pytest.mark.parametrize("value", [
+    {1: 2},
+    {1.5: 'a', True: 'b', None: 'c'},
+    2 ** 70,
+    {"big": [2 ** 64, -2 ** 70]},
+    {"a": [1.5, None, True, "é"]},
+    [],
+    "",
+] + _non_finite)
+@pytest.mark.parametrize("json_codec", _codecs(), ids=lambda c: type(c).__name__)
+def test_same_output_as_stdlib(json_codec, value):
+    if isinstance(json_codec, codec.OrjsonCodec) and value in _non_finite:
+        pytest.skip('orjson encodes non-finite floats as null, see test_orjson_non_finite')
+    if value in _non_finite:
+        # NaN is not equal to itself
+        assert json_codec.dumps(value) == json.dumps(value).encode()
+        return
+    assert json.loads(json_codec.dumps(value)) == json.loads(json.dumps(value))
+    assert json_codec.loads(json_codec.dumps(value)) == json.loads(json.dumps(value))
+
+
+@pytest.mark.skipif(codec.orjson is None, reason='orjson is not installed')
+@pytest.mark.parametrize("value", _non_finite)
+def test_orjson_non_finite(value):
+    assert b'null' in codec.OrjsonCodec().dumps(value)
+
+
+@pytest.mark.parametrize("value", [
+    object(),
+    datetime.datetime(2020, 1, 1, 12, 30),
+    datetime.date(2020, 1, 1),
+    _Point(1),
+])
+@pytest.mark.parametrize("json_codec", _codecs(), ids=lambda c: type(c).__name__)
+def test_unserializable(json_codec, value):
+    with pytest.raises(TypeError):
+        json_codec.dumps({"a": value})
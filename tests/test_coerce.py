@@ -0,0 +1,96 @@
+import enum
+import typing
+import dataclasses
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiosvc.web.server.rpc.coerce import QueryValue, compile_coercer  # noqa: E402
+
+
+class Color(enum.Enum):
+    RED = 1
+    GREEN = 'green'
+
+
+@dataclasses.dataclass
+class Point(object):
+    x: int
+    y: int = 0
+    label: str = None
+
+
+@pytest.mark.parametrize("annotation", [None, typing.Any, 'int', object, typing.Union[int, str]])
+def test_unchecked(annotation):
+    assert compile_coercer(annotation) is None
+
+
+@pytest.mark.parametrize("annotation, value, result", [
+    (int, 1, 1),
+    (int, 2.0, 2),
+    (int, '3', 3),
+    (float, 1, 1.0),
+    (float, '1.5', 1.5),
+    (bool, True, True),
+    (bool, 0, False),
+    (bool, 'Yes', True),
+    (bool, 'off', False),
+    (str, 's', 's'),
+    (str, QueryValue('s'), 's'),
+    (dict, {"a": 1}, {"a": 1}),
+    (typing.Dict[str, int], {"a": 1}, {"a": 1}),
+    (list, [1, 'a'], [1, 'a']),
+    (typing.List[int], [1, '2'], [1, 2]),
+    (typing.List[int], QueryValue('1,2'), [1, 2]),
+    (typing.List[str], QueryValue(''), []),
+    (typing.Optional[int], None, None),
+    (typing.Optional[int], '1', 1),
+    (Color, 1, Color.RED),
+    (Color, '1', Color.RED),
+    (Color, 'green', Color.GREEN),
+    (Color, 'RED', Color.RED),
+    (Point, {"x": '1'}, Point(1)),
+    (Point, {"x": 1, "y": 2, "label": None}, Point(1, 2)),
+    (Point, Point(3), Point(3)),
+])
+def test_coerce(annotation, value, result):
+    coerced = compile_coercer(annotation)(value)
+    assert coerced == result
+    assert type(coerced) is type(result)
+
+
+@pytest.mark.parametrize("annotation, value, error", [
+    (int, 1.5, TypeError),
+    (int, True, TypeError),
+    (int, 'x', ValueError),
+    (int, None, TypeError),
+    (float, False, TypeError),
+    (float, 'x', ValueError),
+    (bool, 2, ValueError),
+    (bool, 'maybe', ValueError),
+    (str, 1, TypeError),
+    (dict, [], TypeError),
+    (list, {}, TypeError),
+    # only query string values are split
+    (typing.List[str], 'a,b', TypeError),
+    (typing.List[int], [1, 'x'], ValueError),
+    (typing.Optional[int], 'x', ValueError),
+    (Color, 'blue', ValueError),
+    (Color, [1], ValueError),
+    (Point, [], TypeError),
+    (Point, {}, ValueError),
+    (Point, {"x": 1, "z": 2}, ValueError),
+    (Point, {"x": 'x'}, ValueError),
+])
+def test_reject(annotation, value, error):
+    with pytest.raises(error):
+        compile_coercer(annotation)(value)
+
+
+def test_optional_default():
+    coerce = compile_coercer(int, optional=True)
+    assert coerce(None) is None
+    assert coerce('1') == 1
+    with pytest.raises(TypeError):
+        compile_coercer(int)(None)
@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiosvc.web.server import compression  # noqa: E402
+
+
+@pytest.mark.parametrize("header, encoding", [
+    (None, None),
+    ('', None),
+    ('identity', None),
+    ('gzip', 'gzip'),
+    ('deflate', 'deflate'),
+    ('deflate, gzip', 'gzip'),
+    ('GZIP;q=0.5', 'gzip'),
+    ('gzip;q=0', None),
+    ('gzip;q=0, deflate', 'deflate'),
+    ('*', 'gzip'),
+    ('gzip;q=0, *', 'deflate'),
+    ('gzip;q=0, deflate;q=0.0, *', None),
+    ('*;q=0', None),
+    ('*;q=0, deflate', 'deflate'),
+    ('gzip;q=x', None),
+])
+def test_accepted_encoding(header, encoding):
+    assert compression.accepted_encoding(header) == encoding
+
+
+@pytest.mark.parametrize("encoding", ['gzip', 'deflate'])
+def test_roundtrip(encoding):
+    data = b'{"id": 1}' * 100
+    compressed = compression.compress(data, encoding)
+    assert compression.is_compressed(compressed, encoding)
+    assert compression.decompress(compressed, encoding, len(data)) == data
+
+
+@pytest.mark.parametrize("encoding", ['gzip', 'deflate'])
+def test_decompress_rejects(encoding):
+    data = b'{"id": 1}' * 100
+    compressed = compression.compress(data, encoding)
+    with pytest.raises(ValueError, match='exceeds'):
+        compression.decompress(compressed, encoding, len(data) - 1)
+    with pytest.raises(ValueError, match='truncated'):
+        compression.decompress(compressed[:len(compressed) // 2], encoding, len(data))
+    with pytest.raises(ValueError, match='malformed'):
+        compression.decompress(b'not compressed', encoding, len(data))
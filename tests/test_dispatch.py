@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiosvc.web.server.rpc.base import MethodPlan, RpcError, RpcHandler  # noqa: E402
+
+
+class _Handler(RpcHandler):
+
+    def __init__(self):
+        super().__init__(route='/rpc')
+
+    async def add(self, a: int, b: int = 2):
+        return a + b
+
+    def sync(self, value):
+        return value
+
+    async def extra(self, a, **kwargs):
+        return dict(kwargs, a=a)
+
+    async def _private(self):
+        return 'private'
+
+    @property
+    def prop(self):
+        return 'prop'
+
+    @staticmethod
+    def static(value):
+        return value
+
+
+def _plan(method):
+    return MethodPlan(method.__name__, method)
+
+
+def test_bind_required_and_default():
+    plan = _plan(_Handler().add)
+    assert plan.bind({"a": 1}, True) == {"a": 1, "b": 2}
+    assert plan.bind({"a": "1", "b": "3"}, True) == {"a": 1, "b": 3}
+    with pytest.raises(RpcError) as e:
+        plan.bind({"b": 3}, True)
+    assert e.value.code == RpcError.RPC_ERR_INVALID_PARAMS
+    assert '"a" not given' in e.value.details
+
+
+def test_bind_invalid_value():
+    with pytest.raises(RpcError) as e:
+        _plan(_Handler().add).bind({"a": "x"}, True)
+    assert e.value.code == RpcError.RPC_ERR_INVALID_PARAMS
+    assert 'parameter "a"' in e.value.details
+
+
+def test_bind_unexpected():
+    plan = _plan(_Handler().add)
+    with pytest.raises(RpcError) as e:
+        plan.bind({"a": 1, "c": 3, "d": 4}, True)
+    assert e.value.details == 'got unexpected parameter(s): c, d'
+    assert plan.bind({"a": 1, "c": 3}, False) == {"a": 1, "b": 2}
+
+
+def test_bind_var_kwargs():
+    plan = _plan(_Handler().extra)
+    assert plan.var_kwargs
+    assert plan.bind({"a": 1, "c": 3}, True) == {"a": 1, "c": 3}
+
+
+def test_dispatch_methods():
+    dispatch = _Handler()._build_dispatch(None)
+    assert {'add', 'sync', 'extra', 'static'} <= set(dispatch)
+    assert '_private' not in dispatch
+    assert 'prop' not in dispatch
+    with pytest.raises(TypeError):
+        dispatch['new'] = None
+
+
+@pytest.mark.parametrize("method, params, result", [
+    ('add', {"a": 1}, 3),
+    ('sync', {"value": 'v'}, 'v'),
+    ('static', {"value": 'v'}, 'v'),
+    ('extra', {"a": 1, "b": 2}, {"a": 1, "b": 2}),
+])
+def test_call(method, params, result):
+    handler = _Handler()
+    handler._dispatch = handler._build_dispatch(None)
+    assert asyncio.run(handler._call_method(handler, method, params, None, True)) == result
+
+
+@pytest.mark.parametrize("method, params, code, details", [
+    ('_private', {}, RpcError.RPC_ERR_METHOD_NOT_FOUND, 'private method'),
+    ('prop', {}, RpcError.RPC_ERR_METHOD_NOT_FOUND, 'not found'),
+    ('missing', {}, RpcError.RPC_ERR_METHOD_NOT_FOUND, 'not found'),
+    ('add', [1], RpcError.RPC_ERR_INVALID_PARAMS_FORMAT, 'not instance of dict'),
+])
+def test_call_rejected(method, params, code, details):
+    handler = _Handler()
+    handler._dispatch = handler._build_dispatch(None)
+    with pytest.raises(RpcError) as e:
+        asyncio.run(handler._call_method(handler, method, params, None, True))
+    assert e.value.code == code
+    assert details in e.value.details
@@ -0,0 +1,137 @@
+import json
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+from aiosvc.web.server.rpc import JsonRpcHandler  # noqa: E402
+
+
+class _Server(object):
+    admission = None
+
+
+class _Handler(JsonRpcHandler):
+
+    def __init__(self, route='/rpc', **options):
+        super().__init__(route=route)
+        for name, value in options.items():
+            setattr(self, '_' + name, value)
+        self.running = 0
+        self.peak = 0
+
+    async def sleep(self, t):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(t)
+        finally:
+            self.running -= 1
+        return t
+
+    async def unencodable(self):
+        return object()
+
+    async def echo(self, value):
+        return value
+
+    async def fail(self):
+        raise KeyError('fail')
+
+
+class _LoggedHandler(_Handler):
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.logged = []
+
+    async def _log(self, log_data):
+        self.logged.append(log_data)
+
+
+def _run(handler, batch, headers=None):
+    """
+    :return: decoded response to the batch
+    """
+    async def run():
+        http_app = web.Application()
+        await handler._setup(asyncio.get_running_loop(), None, _Server(), http_app)
+        try:
+            async with TestClient(TestServer(http_app)) as client:
+                resp = await client.post('/rpc', data=json.dumps(batch), headers=headers)
+                return json.loads(await resp.read())
+        finally:
+            if handler._request_log is not None:
+                await handler._request_log.stop()
+    return asyncio.run(run())
+
+
+def _calls(*durations):
+    return [{"jsonrpc": "2.0", "id": i, "method": "sleep", "params": {"t": t}} for i, t in enumerate(durations)]
+
+
+def test_batch_size_limit():
+    handler = _Handler(max_batch_size=2)
+    assert len(_run(handler, _calls(0, 0))) == 2
+    handler.peak = 0
+    response = _run(handler, _calls(0, 0, 0))
+    assert response["error"]["code"] == -32600
+    # no call of a rejected batch is executed
+    assert handler.peak == 0
+
+
+def test_batch_invalid_element():
+    response = _run(_Handler(), _calls(0) + [1])
+    assert response["error"]["code"] == -32600
+
+
+@pytest.mark.parametrize("options, peak", [
+    ({}, 6),
+    ({"batch_concurrency": 2}, 2),
+    ({"concurrency": 3}, 3),
+    ({"concurrent_batch_call": False}, 1),
+    ({"stream_batch": True, "batch_concurrency": 2}, 2),
+])
+def test_batch_concurrency(options, peak):
+    handler = _Handler(**options)
+    response = _run(handler, _calls(*[0.01] * 6))
+    assert [r["result"] for r in response] == [0.01] * 6
+    assert handler.peak == peak
+
+
+@pytest.mark.parametrize("stream_batch", [False, True])
+def test_call_timeout(stream_batch):
+    response = _run(_Handler(call_timeout=0.05, stream_batch=stream_batch), _calls(0, 1))
+    assert response[0]["result"] == 0
+    assert response[1]["error"]["code"] == -32001
+
+
+def test_stream_unencodable_result():
+    response = _run(_Handler(stream_batch=True), [
+        {"jsonrpc": "2.0", "id": 1, "method": "sleep", "params": {"t": 0}},
+        {"jsonrpc": "2.0", "id": 2, "method": "unencodable"},
+        {"jsonrpc": "2.0", "id": 3, "method": "sleep", "params": {"t": 0}},
+    ])
+    assert [r["id"] for r in response] == [1, 2, 3]
+    assert response[1]["error"]["code"] == -32603
+    assert response[2]["result"] == 0
+
+
+def test_log_records():
+    handler = _LoggedHandler(logging=2, compress_min_size=0, log_body_size=20)
+    _run(handler, {"jsonrpc": "2.0", "id": 1, "method": "echo", "params": {"value": "x" * 100}},
+         headers={'Accept-Encoding': 'gzip'})
+    ok, = handler.logged
+    handler = _LoggedHandler(logging=1)
+    _run(handler, {"jsonrpc": "2.0", "id": 2, "method": "fail"})
+    failed, = handler.logged
+    assert ok["request_body"] == '{"jsonrpc": "2.0", "...'
+    # the uncompressed response body, cut to log_body_size
+    assert ok["response_body"].startswith('{"') and ok["response_body"].endswith('...')
+    assert ok["response_status"] == 200 and "error" not in ok
+    assert failed["error"] == "'fail'"
+    assert 'KeyError' in failed["traceback"]
@@ -0,0 +1,41 @@
+import time
+
+from aiosvc.lru import LruCache
+
+
+def test_evicts_least_recently_used():
+    evicted = []
+    cache = LruCache(2, on_evict=lambda key, value: evicted.append((key, value)))
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert evicted == [('b', 2)]
+    assert list(cache) == ['a', 'c']
+    # overwriting is not an eviction
+    cache.set('a', 4)
+    assert evicted == [('b', 2)] and len(cache) == 2
+
+
+def test_ttl():
+    evicted = []
+    cache = LruCache(10, ttl=0.01, on_evict=lambda key, value: evicted.append(key))
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=10)
+    cache.set('c', None)
+    assert cache.get('c', 'missing') is None
+    time.sleep(0.02)
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert evicted == ['a']
+
+
+def test_pop_and_clear():
+    evicted = []
+    cache = LruCache(10, ttl=0, on_evict=lambda key, value: evicted.append(key))
+    cache.set('a', 1)
+    assert cache.pop('a') == 1
+    assert cache.pop('a', 'missing') == 'missing'
+    cache.set('b', 2)
+    cache.clear()
+    assert len(cache) == 0 and evicted == []
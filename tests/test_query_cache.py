@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+asyncpg = pytest.importorskip("asyncpg")
+
+from aiosvc.db.cache import QueryCache  # noqa: E402
+
+
+def test_listener_connect_kwargs(monkeypatch):
+    calls = []
+
+    async def connect(**kwargs):
+        calls.append(kwargs)
+        raise ConnectionRefusedError()
+
+    monkeypatch.setattr(asyncpg, 'connect', connect)
+
+    async def run():
+        cache = QueryCache('postgres://localhost/test', {'max_inactive_connection_lifetime': 60, 'command_timeout': 5})
+        await cache.start()
+        await cache.stop()
+
+    asyncio.run(run())
+    assert calls == [{'dsn': 'postgres://localhost/test', 'command_timeout': 5}]
+
+
+def _connected_cache(**kwargs):
+    cache = QueryCache('postgres://localhost/test', {}, **kwargs)
+    # stands for the listener connection, set() stores nothing while disconnected
+    cache._conn = object()
+    return cache
+
+
+def test_invalidate():
+    cache = _connected_cache()
+    cache.set('a', [1], ('users', ), cache.token(('users', )))
+    cache.set('b', [2], ('users', 'groups'), cache.token(('users', 'groups')))
+    cache.set('c', [3], ('groups', ), cache.token(('groups', )))
+    cache.invalidate('users')
+    assert cache.get('a') == (False, None) and cache.get('b') == (False, None)
+    assert cache.get('c') == (True, [3])
+    assert cache._tags == {'groups': {'c'}}
+
+
+def test_stale_token():
+    cache = _connected_cache()
+    token = cache.token(('users', ))
+    cache.invalidate('users')
+    assert not cache.set('a', [1], ('users', ), token)
+    cache._conn = None
+    assert not cache.set('a', [1], ('users', ), cache.token(('users', )))
+
+
+def test_evicted_entries_are_untagged():
+    cache = _connected_cache(maxsize=1, ttl=0)
+    cache.set('a', [1], ('users', ), cache.token(('users', )))
+    cache.set('b', [2], ('groups', ), cache.token(('groups', )), ttl=10)
+    assert cache._tags == {'groups': {'b'}}
+    cache.set('c', [3], ('users', ), cache.token(('users', )))
+    # expired
+    assert cache.get('c') == (False, None)
+    assert cache._tags == {}
+
+
+class _Connection(object):
+    """
+    Fails an operation started while another one is in progress, as asyncpg does
+    """
+
+    def __init__(self):
+        self.busy = False
+        self.listening = []
+        self.pings = 0
+
+    async def _operation(self):
+        if self.busy:
+            raise asyncpg.InterfaceError('another operation is in progress')
+        self.busy = True
+        try:
+            await asyncio.sleep(0.002)
+        finally:
+            self.busy = False
+
+    async def add_listener(self, channel, callback):
+        await self._operation()
+        self.listening.append(channel)
+
+    async def fetchval(self, query, timeout=None):
+        await self._operation()
+        self.pings += 1
+
+    def add_termination_listener(self, callback):
+        pass
+
+    def is_closed(self):
+        return False
+
+    def terminate(self):
+        pass
+
+
+def test_concurrent_subscribe(monkeypatch):
+    conn = _Connection()
+
+    async def connect(**kwargs):
+        return conn
+
+    monkeypatch.setattr(asyncpg, 'connect', connect)
+
+    async def run():
+        cache = QueryCache('postgres://localhost/test', {}, ping_interval=0.001)
+        await cache.start()
+        try:
+            results = await asyncio.gather(cache.subscribe(('a', 'b')), cache.subscribe(('c', 'a')),
+                                           cache.subscribe(('d', )))
+            assert results == [True, True, True]
+            cache.set('k', [1], ('a', ), cache.token(('a', )))
+            await asyncio.sleep(0.02)
+            # pings did not collide with the LISTENs, the connection and the cache were kept
+            assert cache.connected and cache.get('k') == (True, [1])
+        finally:
+            await cache.stop()
+
+    asyncio.run(run())
+    assert sorted(conn.listening) == ['a', 'b', 'c', 'd']
+    assert conn.pings > 0
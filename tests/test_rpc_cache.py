@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiosvc.web.codec import JsonCodec  # noqa: E402
+from aiosvc.web.server.rpc.cache import MethodCache, cached  # noqa: E402
+
+
+class _Redis(object):
+
+    def __init__(self):
+        self.data = {}
+        self.down = False
+
+    async def execute(self, command, *args):
+        if self.down:
+            raise ConnectionError('redis is down')
+        if command == 'get':
+            return self.data.get(args[0])
+        if command == 'set':
+            self.data[args[0]] = args[1]
+        elif command == 'del':
+            for key in args:
+                self.data.pop(key, None)
+        elif command == 'scan':
+            prefix = args[2].rstrip('*')
+            return b'0', [key for key in self.data if key.startswith(prefix)]
+
+
+def test_local_ttl_required_with_redis():
+    with pytest.raises(UserWarning):
+        cached(redis='redis', local_ttl=None)
+    with pytest.raises(UserWarning):
+        MethodCache('m', JsonCodec(), redis=_Redis(), local_ttl=None)
+
+
+def test_invalidation_reaches_other_processes():
+    async def run():
+        redis = _Redis()
+        ours = MethodCache('m', JsonCodec(), redis=redis, local_ttl=0.05)
+        theirs = MethodCache('m', JsonCodec(), redis=redis, local_ttl=0.05)
+        key = MethodCache.key({"id": 1})
+        await ours.set(key, 1)
+        assert await theirs.get(key) == (True, 1)
+
+        await ours.invalidate({"id": 1})
+        await asyncio.sleep(0.06)
+        assert await theirs.get(key) == (False, None)
+
+    asyncio.run(run())
+
+
+def test_local_ttl_bounded_by_ttl():
+    async def run():
+        cache = MethodCache('m', JsonCodec(), ttl=0.01, redis=_Redis(), local_ttl=10)
+        await cache.set('k', 1)
+        await asyncio.sleep(0.02)
+        assert cache._entries.get('k') is None
+
+    asyncio.run(run())
+
+
+def test_invalidate_survives_redis_outage():
+    async def run():
+        redis = _Redis()
+        cache = MethodCache('m', JsonCodec(), redis=redis)
+        key = MethodCache.key({"id": 1})
+        await cache.set(key, 1)
+        redis.down = True
+        await cache.invalidate({"id": 1})
+        await cache.invalidate()
+        assert await cache.get(key) == (False, None)
+
+    asyncio.run(run())
+
+
+def test_unencodable_value_skips_redis():
+    async def run():
+        redis = _Redis()
+        cache = MethodCache('m', JsonCodec(), redis=redis)
+        await cache.set('k', b'\x00')
+        assert redis.data == {}
+        assert await cache.get('k') == (True, b'\x00')
+
+    asyncio.run(run())
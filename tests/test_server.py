@@ -0,0 +1,27 @@
+import socket
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiosvc.web.server import Server  # noqa: E402
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.parametrize("host", [None, 'localhost', '127.0.0.1'])
+def test_before_fork_binds_every_address(host):
+    port = _free_port()
+    server = Server([], host=host, port=port)
+    server._before_fork()
+    try:
+        expected = {info[4][:2] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM,
+                                                                  flags=socket.AI_PASSIVE)}
+        assert {sock.getsockname()[:2] for sock in server._socks} == expected
+    finally:
+        for sock in server._socks:
+            sock.close()
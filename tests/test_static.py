@@ -0,0 +1,45 @@
+import os
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+from aiosvc.web.server import StaticHandler  # noqa: E402
+
+
+class _Server(object):
+    admission = None
+
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_cached_files(tmp_path):
+    for name in ('a.txt', 'b.txt', 'c.txt'):
+        _write(os.path.join(str(tmp_path), name), name.encode())
+    handler = StaticHandler('/static/', str(tmp_path), cache_size=2, stat_ttl=0)
+
+    async def run():
+        http_app = web.Application()
+        await handler._setup(asyncio.get_running_loop(), None, _Server(), http_app)
+        async with TestClient(TestServer(http_app)) as client:
+            async def get(name):
+                resp = await client.get('/static/' + name)
+                return resp.status, await resp.read()
+
+            assert await get('a.txt') == (200, b'a.txt')
+            assert await get('b.txt') == (200, b'b.txt')
+            assert await get('c.txt') == (200, b'c.txt')
+            assert (await get('missing.txt'))[0] == 404
+            # changed files are revalidated once stat_ttl passes
+            _write(os.path.join(str(tmp_path), 'c.txt'), b'changed')
+            assert await get('c.txt') == (200, b'changed')
+
+    asyncio.run(run())
+    assert len(handler._entries) == 2
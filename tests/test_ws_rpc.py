@@ -0,0 +1,87 @@
+import json
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+from aiosvc.web.server.rpc import WsJsonRpcHandler  # noqa: E402
+
+
+class _Server(object):
+    admission = None
+
+
+class _Handler(WsJsonRpcHandler):
+
+    def __init__(self):
+        super().__init__(route='/ws')
+        self.notified = []
+
+    async def sleep(self, t):
+        await asyncio.sleep(t)
+        return t
+
+    async def notify(self, value):
+        self.notified.append(value)
+
+    async def unencodable(self):
+        return object()
+
+
+def _run(check):
+    handler = _Handler()
+
+    async def run():
+        http_app = web.Application()
+        await handler._setup(asyncio.get_running_loop(), None, _Server(), http_app)
+        async with TestClient(TestServer(http_app)) as client:
+            ws = await client.ws_connect('/ws')
+            try:
+                await asyncio.wait_for(check(ws, handler), 5)
+            finally:
+                await ws.close()
+    asyncio.run(run())
+
+
+def _call(id, method, **params):
+    call = {"jsonrpc": "2.0", "method": method, "params": params}
+    if id is not None:
+        call["id"] = id
+    return call
+
+
+def test_responses_matched_by_id():
+    async def check(ws, handler):
+        await ws.send_str(json.dumps(_call(1, "sleep", t=0.05)))
+        await ws.send_str(json.dumps(_call(2, "sleep", t=0)))
+        first, second = await ws.receive_json(), await ws.receive_json()
+        # calls of a connection run concurrently, the faster one answers first
+        assert (first["id"], first["result"]) == (2, 0)
+        assert (second["id"], second["result"]) == (1, 0.05)
+    _run(check)
+
+
+def test_notifications_get_no_reply():
+    async def check(ws, handler):
+        await ws.send_str(json.dumps(_call(None, "notify", value=1)))
+        await ws.send_str(json.dumps([_call(None, "notify", value=2), _call(3, "sleep", t=0)]))
+        response = await ws.receive_json()
+        assert response == [{"jsonrpc": "2.0", "id": 3, "result": 0}]
+        assert sorted(handler.notified) == [1, 2]
+    _run(check)
+
+
+def test_unencodable_result():
+    async def check(ws, handler):
+        await ws.send_str(json.dumps(_call(1, "unencodable")))
+        response = await ws.receive_json()
+        assert response["id"] == 1 and response["error"]["code"] == -32603
+        await ws.send_str(json.dumps([_call(2, "unencodable"), _call(3, "sleep", t=0)]))
+        response = await ws.receive_json()
+        assert response[0]["id"] == 2 and response[0]["error"]["code"] == -32603
+        assert response[1] == {"jsonrpc": "2.0", "id": 3, "result": 0}
+    _run(check)